@@ -0,0 +1,193 @@
+# Food Monitoring System - Offline Training Benchmark
+# Generates synthetic SensorData with the same schema and status thresholds as
+# the ESP firmware, then times preprocessing, rollout and optimization without
+# touching Google Sheets, so every trainer change gets a repeatable number.
+#
+# Usage: python benchmark.py --rows 1000 100000 10000000 --episodes 50
+
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.optim as optim
+
+from deepq_reinforcement import (
+    DQN, ReplayMemory, PrioritizedReplayMemory, MEMORY_SIZE, EPISODE_LENGTH,
+    NUM_ENVS, PARSE_CHUNK_SIZE, TIMESTAMP_FORMAT, preprocess_rows,
+    build_feature_matrix, run_episode
+)
+from training_profiler import TrainingProfiler, PHASES, peak_rss_mb
+
+# Status thresholds, mirrored from Hardware Configuration/Arduino/ESP/ESP.ino
+TEMP_NORMAL_MIN = 4.0
+TEMP_NORMAL_MAX = 15.0
+HUM_NORMAL_MIN = 30.0
+HUM_NORMAL_MAX = 60.0
+GAS_NORMAL_MAX = 300
+TEMP_RISK_MAX = 25.0
+HUM_RISK_MAX = 80.0
+GAS_RISK_MAX = 600
+
+HEADER = ['Timestamp', 'Temperature', 'Humidity', 'Gas', 'Status']
+READING_INTERVAL_S = 15  # Spacing between synthetic readings
+START_TIME = datetime(2025, 1, 1)
+
+
+def esp_status(temperature, humidity, gas):
+    """Vectorized copy of updateFoodStatus() from the ESP firmware"""
+    normal = ((temperature >= TEMP_NORMAL_MIN) & (temperature <= TEMP_NORMAL_MAX) &
+              (humidity >= HUM_NORMAL_MIN) & (humidity <= HUM_NORMAL_MAX) &
+              (gas <= GAS_NORMAL_MAX))
+    spoiled = (temperature > TEMP_RISK_MAX) | (humidity > HUM_RISK_MAX) | (gas > GAS_RISK_MAX)
+    return np.where(normal, 'Normal', np.where(spoiled, 'Spoiled', 'At Risk'))
+
+
+def synthetic_rows(rng, offset, count):
+    """Raw sheet rows (all strings, like get_all_values()) for readings offset..offset+count"""
+    temperature = rng.normal(12.0, 7.0, count).round(1)
+    humidity = rng.normal(55.0, 15.0, count).round(1)
+    gas = rng.gamma(4.0, 70.0, count).astype(int)
+    status = esp_status(temperature, humidity, gas)
+
+    seconds = (offset + np.arange(count)) * READING_INTERVAL_S
+    timestamps = (pd.Timestamp(START_TIME) + pd.to_timedelta(seconds, unit='s')).strftime(TIMESTAMP_FORMAT)
+
+    return [list(row) for row in zip(timestamps, temperature.astype(str), humidity.astype(str),
+                                     gas.astype(str), status)]
+
+
+def iter_synthetic_rows(n_rows, seed, chunk_size, timings):
+    # Generated lazily so 10M-row runs never hold the raw strings in memory at once;
+    # generation time is tracked separately so it isn't counted as parse time
+    rng = np.random.default_rng(seed)
+    for offset in range(0, n_rows, chunk_size):
+        start = time.perf_counter()
+        rows = synthetic_rows(rng, offset, min(chunk_size, n_rows - offset))
+        timings['generate'] += time.perf_counter() - start
+        yield from rows
+
+
+def bench_preprocess(n_rows, seed, chunk_size):
+    timings = {'generate': 0.0}
+    start = time.perf_counter()
+    data_df = preprocess_rows(HEADER, iter_synthetic_rows(n_rows, seed, chunk_size, timings), chunk_size)
+    parse_time = time.perf_counter() - start - timings['generate']
+
+    return data_df, {
+        'generate_s': timings['generate'],
+        'preprocess_s': parse_time,
+        'preprocess_rows_per_sec': n_rows / parse_time if parse_time > 0 else 0.0,
+        'dataframe_mb': data_df.memory_usage(deep=True).sum() / (1024 * 1024)
+    }
+
+
+def bench_training(data_df, episodes, num_envs, prioritized, seed):
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+
+    start = time.perf_counter()
+    features, status_codes = build_feature_matrix(data_df)
+    feature_time = time.perf_counter() - start
+
+    policy_net = DQN(4, 3)
+    target_net = DQN(4, 3)
+    target_net.load_state_dict(policy_net.state_dict())
+    target_net.eval()
+    optimizer = optim.RMSprop(policy_net.parameters())
+    memory = (PrioritizedReplayMemory if prioritized else ReplayMemory)(MEMORY_SIZE)
+
+    # Same phases train_model records, summed over all episodes
+    profiler = TrainingProfiler()
+    phase_totals = dict.fromkeys(PHASES, 0.0)
+    steps_done = 0
+    transitions = 0
+
+    start = time.perf_counter()
+    for _ in range(episodes):
+        profiler.start_episode()
+        episode_idx = np.sort([rng.choice(len(features), size=EPISODE_LENGTH, replace=False)
+                               for _ in range(num_envs)], axis=1)
+        _, _, _, steps_done = run_episode(policy_net, target_net, optimizer, memory,
+                                          features, status_codes, episode_idx, steps_done, profiler)
+        transitions += num_envs * (EPISODE_LENGTH - 1)
+        for name in PHASES:
+            phase_totals[name] += profiler.phase_times.get(name, 0.0)
+    train_time = time.perf_counter() - start
+
+    results = {
+        'feature_matrix_s': feature_time,
+        'train_s': train_time,
+        'steps_per_sec': episodes * (EPISODE_LENGTH - 1) / train_time if train_time > 0 else 0.0,
+        'transitions_per_sec': transitions / train_time if train_time > 0 else 0.0
+    }
+    results.update({f'time_{name}_s': total for name, total in phase_totals.items()})
+    return results
+
+
+def run_benchmark(n_rows, episodes=50, num_envs=NUM_ENVS, prioritized=False,
+                  chunk_size=PARSE_CHUNK_SIZE, seed=0):
+    print(f"Benchmarking {n_rows} rows ({episodes} episodes, {num_envs} envs, "
+          f"{'prioritized' if prioritized else 'uniform'} replay)")
+
+    data_df, results = bench_preprocess(n_rows, seed, chunk_size)
+    results.update(bench_training(data_df, episodes, num_envs, prioritized, seed))
+    results.update({
+        'rows': n_rows,
+        'valid_rows': len(data_df),
+        'episodes': episodes,
+        'num_envs': num_envs,
+        'prioritized': prioritized,
+        'peak_rss_mb': peak_rss_mb(),
+        'torch_threads': torch.get_num_threads(),
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+    print(f"  preprocess: {results['preprocess_s']:.3f}s ({results['preprocess_rows_per_sec']:,.0f} rows/s), "
+          f"dataframe {results['dataframe_mb']:.1f} MB")
+    print(f"  training:   {results['train_s']:.3f}s ({results['steps_per_sec']:,.1f} steps/s, "
+          f"{results['transitions_per_sec']:,.1f} transitions/s)")
+    print("  phases:     " + ", ".join(f"{name} {results[f'time_{name}_s']:.3f}s" for name in PHASES))
+    peak = results['peak_rss_mb']
+    print(f"  peak RSS:   {peak:.1f} MB" if peak is not None else "  peak RSS:   unavailable")
+
+    return results
+
+
+def save_results(results, path):
+    # Append so successive runs (e.g. before/after a change) accumulate in one file
+    write_header = not os.path.exists(path)
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        if write_header:
+            writer.writeheader()
+        writer.writerows(results)
+    print(f"Benchmark results appended to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the DQN training pipeline")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000],
+                        help="Synthetic dataset sizes to benchmark (e.g. 1000 100000 10000000)")
+    parser.add_argument('--episodes', type=int, default=50)
+    parser.add_argument('--num-envs', type=int, default=NUM_ENVS)
+    parser.add_argument('--prioritized', action='store_true', help="Use prioritized replay")
+    parser.add_argument('--chunk-size', type=int, default=PARSE_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="CSV file to append results to")
+    args = parser.parse_args()
+
+    results = [run_benchmark(n_rows, args.episodes, args.num_envs, args.prioritized,
+                             args.chunk_size, args.seed)
+               for n_rows in args.rows]
+
+    if args.output:
+        save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
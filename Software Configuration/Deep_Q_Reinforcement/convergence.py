@@ -0,0 +1,74 @@
+# Food Monitoring System - Convergence Monitor
+# Decides when a training cycle is good enough to stop early: moving-window
+# loss and accuracy have plateaued, accuracy has reached its target, or the
+# wall-clock budget would be exceeded by another episode
+
+import time
+
+import numpy as np
+
+
+class ConvergenceMonitor:
+    def __init__(self, window=10, min_episodes=20, loss_tolerance=0.01,
+                 accuracy_tolerance=1.0, target_accuracy=None, time_budget=None):
+        self.window = window
+        self.min_episodes = max(min_episodes, 2 * window)
+        self.loss_tolerance = loss_tolerance  # Relative change in windowed mean loss
+        self.accuracy_tolerance = accuracy_tolerance  # Change in windowed mean accuracy (points)
+        self.target_accuracy = target_accuracy
+        self.time_budget = time_budget  # Seconds
+
+        self.losses = []
+        self.accuracies = []
+        self.best_accuracy = None
+        self.start_time = time.perf_counter()
+
+    @property
+    def episodes(self):
+        return len(self.accuracies)
+
+    def moving_accuracy(self):
+        return float(np.mean(self.accuracies[-self.window:]))
+
+    def update(self, loss, accuracy):
+        """Record an episode; returns True when the moving accuracy is a new best"""
+        self.losses.append(loss)
+        self.accuracies.append(accuracy)
+
+        # Too few episodes for a meaningful moving average; only the first is
+        # reported, so there is always a checkpoint to fall back on
+        if self.episodes < self.window:
+            return self.episodes == 1
+
+        current = self.moving_accuracy()
+        if self.best_accuracy is None or current > self.best_accuracy:
+            self.best_accuracy = current
+            return True
+        return False
+
+    def should_stop(self):
+        """Reason to stop training now, or None to keep going"""
+        elapsed = time.perf_counter() - self.start_time
+        if self.time_budget is not None and self.episodes:
+            # Stop if one more average-length episode would overrun the budget
+            if elapsed + elapsed / self.episodes > self.time_budget:
+                return f"time budget of {self.time_budget}s reached"
+
+        if self.episodes < self.min_episodes:
+            return None
+
+        if self.target_accuracy is not None and self.moving_accuracy() >= self.target_accuracy:
+            return f"moving accuracy reached {self.target_accuracy:.1f}%"
+
+        # Compare the latest window with the one before it
+        previous = slice(-2 * self.window, -self.window)
+        latest = slice(-self.window, None)
+        previous_loss = np.mean(self.losses[previous])
+        loss_change = abs(np.mean(self.losses[latest]) - previous_loss) / max(abs(previous_loss), 1e-8)
+        accuracy_change = abs(np.mean(self.accuracies[latest]) - np.mean(self.accuracies[previous]))
+
+        if loss_change < self.loss_tolerance and accuracy_change < self.accuracy_tolerance:
+            return (f"converged (loss changed {loss_change:.2%}, "
+                    f"accuracy changed {accuracy_change:.2f} points over {self.window} episodes)")
+
+        return None
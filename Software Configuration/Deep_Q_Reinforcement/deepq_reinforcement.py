@@ -2,6 +2,8 @@
 # This script trains a reinforcement learning model to optimize food distribution decisions
 # based on sensor data from the monitoring system
 
+import argparse
+import sys
 import numpy as np
 import pandas as pd
 import torch
@@ -10,16 +12,23 @@ import torch.optim as optim
 import torch.nn.functional as F
 import random
 import time
+import itertools
 import requests
 import csv
 import os
 from datetime import datetime
-from collections import deque, namedtuple
+from collections import Counter, namedtuple
 
 # For Google Sheets API
 import gspread
 from google.oauth2.service_account import Credentials
 
+# Local cache of already-downloaded sensor readings
+from sensor_cache import SensorCache
+from training_profiler import TrainingProfiler
+from convergence import ConvergenceMonitor
+from numpy_dqn import export_checked, WEIGHT_FILE_SUFFIX
+
 # Constants
 BATCH_SIZE = 64
 GAMMA = 0.99  # discount factor
@@ -29,6 +38,57 @@ EPS_DECAY = 200
 TARGET_UPDATE = 10
 MEMORY_SIZE = 10000
 MIN_ENTRIES = 100  # Minimum entries before training
+EPISODE_LENGTH = 10  # Readings sampled per training episode
+NUM_ENVS = 1  # Episodes stepped in lockstep per training iteration
+
+# Prioritized experience replay: transitions are sampled in proportion to their
+# TD error, so rare high-reward (e.g. Spoiled) transitions are replayed more often
+PRIORITIZED_REPLAY = False
+PER_ALPHA = 0.6  # How strongly priorities skew sampling (0 = uniform)
+PER_BETA_START = 0.4  # Initial importance-sampling correction, annealed to 1
+PER_BETA_STEPS = 10000  # Samples over which beta reaches 1
+PER_EPSILON = 1e-3  # Keeps zero-error transitions sampleable
+
+# Incremental training: each cycle continues from the previous cycle's weights,
+# optimizer state and replay buffer, and samples most episodes from new rows
+INCREMENTAL_TRAINING = True
+NEW_DATA_FRACTION = 0.8  # Share of episodes drawn from rows added since the last cycle
+MODELS_DIR = 'models'
+TRAINING_STATE_PATH = os.path.join(MODELS_DIR, 'training_state.pth')
+
+# Early stopping: a cycle runs at most MAX_EPISODES and stops sooner once
+# windowed loss and accuracy plateau, accuracy hits its target, or the
+# wall-clock budget (kept under /run_training's 300s timeout) runs out
+MAX_EPISODES = 50
+MIN_EPISODES = 20
+CONVERGENCE_WINDOW = 10
+LOSS_TOLERANCE = 0.01  # Relative change in windowed mean loss
+ACCURACY_TOLERANCE = 1.0  # Change in windowed mean accuracy, in percentage points
+TARGET_ACCURACY = 95.0  # Moving accuracy (%) that is good enough to stop
+TRAINING_TIME_BUDGET = 240  # Seconds
+
+# Each saved model is also exported for the torch-free NumPy inference engine;
+# 'float16' or 'int8' shrink the file and fall back to float32 if decisions change
+EXPORT_WEIGHT_MODE = 'float32'
+AGREEMENT_SAMPLES = 10000  # Training rows used to check the exported model's decisions
+
+# Per-episode phase timings, throughput and peak RSS are added to the metrics CSV;
+# PROFILE_TRACE additionally dumps a torch.profiler Chrome trace for each cycle
+PROFILE_TRAINING = True
+PROFILE_TRACE = False
+TRACE_DIR = 'metrics'
+
+# Preprocessed SensorData rows and the sheet sync cursor
+SENSOR_CACHE_PATH = 'sensor_cache.db'
+
+# State features fed to the network and the status labels they are scored against
+FEATURE_COLUMNS = ['Temperature', 'Humidity', 'Gas', 'TimeSinceStart']
+STATUS_CODES = {'Normal': 0, 'At Risk': 1, 'Spoiled': 2}
+
+# Raw sheet parsing
+SENSOR_COLUMNS = ['Temperature', 'Humidity', 'Gas']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # Rows in another format fall back to inference
+PARSE_CHUNK_SIZE = 100000  # Raw rows converted per block, bounds peak memory
 
 # Google Sheets and GAS configuration
 SPREADSHEET_URL = "spreadsheet_url"
@@ -66,22 +126,164 @@ def setup_google_sheets():
     # Return the client
     return client
 
-# Named tuple for storing transitions
-Transition = namedtuple('Transition', ('state', 'action', 'next_state', 'reward'))
+# Named tuple for a sampled batch of transitions (each field is a batched tensor)
+Transition = namedtuple('Transition', ('state', 'action', 'next_state', 'reward', 'done'))
 
 # Replay Memory
+# Transitions live in preallocated contiguous tensors used as a ring buffer, so
+# pushing writes into existing storage and sampling a batch is a single gather
 class ReplayMemory:
-    def __init__(self, capacity):
-        self.memory = deque([], maxlen=capacity)
+    def __init__(self, capacity, state_size=4):
+        self.capacity = capacity
+        self.states = torch.zeros((capacity, state_size), dtype=torch.float32)
+        self.actions = torch.zeros((capacity, 1), dtype=torch.long)
+        self.rewards = torch.zeros(capacity, dtype=torch.float32)
+        self.next_states = torch.zeros((capacity, state_size), dtype=torch.float32)
+        self.dones = torch.zeros(capacity, dtype=torch.bool)
+        self.position = 0
+        self.size = 0
+
+    def push(self, state, action, next_state, reward):
+        # Accepts a single transition (1-row tensors) or a batch of rows;
+        # a next_state of None marks a terminal transition
+        state = state.reshape(-1, self.states.shape[1])
+        n = state.shape[0]
+        idx = (self.position + torch.arange(n)) % self.capacity
+
+        self.states[idx] = state
+        self.actions[idx] = torch.as_tensor(action, dtype=torch.long).reshape(n, 1)
+        self.rewards[idx] = torch.as_tensor(reward, dtype=torch.float32).reshape(n)
+        if next_state is None:
+            self.next_states[idx] = 0
+            self.dones[idx] = True
+        else:
+            self.next_states[idx] = next_state.reshape(n, -1)
+            self.dones[idx] = False
 
-    def push(self, *args):
-        self.memory.append(Transition(*args))
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+        return idx
 
     def sample(self, batch_size):
-        return random.sample(self.memory, batch_size)
+        idx = torch.randint(0, self.size, (batch_size,))
+        return Transition(self.states[idx], self.actions[idx], self.next_states[idx],
+                          self.rewards[idx], self.dones[idx])
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
+
+    def state_dict(self):
+        # Stored transitions in insertion order, oldest first
+        idx = (self.position - self.size + torch.arange(self.size)) % self.capacity
+        return {
+            'states': self.states[idx],
+            'actions': self.actions[idx],
+            'rewards': self.rewards[idx],
+            'next_states': self.next_states[idx],
+            'dones': self.dones[idx]
+        }
+
+    def load_state_dict(self, state):
+        # Keep the most recent transitions if the saved buffer is larger than this one
+        n = min(state['states'].shape[0], self.capacity)
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+            getattr(self, name)[:n] = state[name][-n:] if n else state[name][:0]
+        self.size = n
+        self.position = n % self.capacity
+
+# Sum tree over replay priorities: updates and prefix-sum lookups are O(log n).
+# Leaves hold priorities, every internal node holds the sum of its children.
+class SumTree:
+    def __init__(self, capacity):
+        self.leaf_count = 2
+        while self.leaf_count < capacity:
+            self.leaf_count *= 2
+        self.tree = np.zeros(2 * self.leaf_count, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def get(self, idx):
+        return self.tree[idx + self.leaf_count]
+
+    def update(self, idx, priorities):
+        nodes = np.asarray(idx) + self.leaf_count
+        self.tree[nodes] = priorities
+
+        # Recompute parent sums one level at a time for all touched nodes
+        nodes = np.unique(nodes // 2)
+        while True:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        # Descend from the root for a whole batch of prefix-sum values at once
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_count:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return nodes - self.leaf_count
+
+# Replay Memory with proportional prioritization
+class PrioritizedReplayMemory(ReplayMemory):
+    def __init__(self, capacity, state_size=4, alpha=PER_ALPHA):
+        super().__init__(capacity, state_size)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.max_priority = 1.0
+        self.samples_drawn = 0
+
+    def push(self, state, action, next_state, reward):
+        # New transitions get the highest priority seen so they are replayed at least once
+        idx = super().push(state, action, next_state, reward)
+        self.tree.update(idx.numpy(), self.max_priority ** self.alpha)
+        return idx
+
+    def sample(self, batch_size):
+        # Stratified sampling: one draw from each equal slice of the total priority mass
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        idx = np.minimum(self.tree.find(values), self.size - 1)
+
+        # Importance-sampling weights undo the bias from non-uniform sampling
+        beta = min(1.0, PER_BETA_START + (1.0 - PER_BETA_START) * self.samples_drawn / PER_BETA_STEPS)
+        self.samples_drawn += 1
+        probs = np.maximum(self.tree.get(idx), 1e-12) / self.tree.total
+        weights = (self.size * probs) ** -beta
+        weights = torch.as_tensor(weights / weights.max(), dtype=torch.float32)
+
+        idx = torch.from_numpy(idx)
+        batch = Transition(self.states[idx], self.actions[idx], self.next_states[idx],
+                           self.rewards[idx], self.dones[idx])
+        return batch, idx, weights
+
+    def update_priorities(self, idx, td_errors):
+        priorities = td_errors.abs().numpy().astype(np.float64) + PER_EPSILON
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx.numpy(), priorities ** self.alpha)
+
+    def state_dict(self):
+        state = super().state_dict()
+        idx = (self.position - self.size + np.arange(self.size)) % self.capacity
+        state['priorities'] = torch.from_numpy(self.tree.get(idx))
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree = SumTree(self.capacity)
+        if self.size:
+            if 'priorities' in state:
+                priorities = state['priorities'][-self.size:].numpy()
+            else:
+                priorities = np.full(self.size, self.max_priority ** self.alpha)
+            self.tree.update(np.arange(self.size), priorities)
 
 # Neural Network for Deep Q Learning
 class DQN(nn.Module):
@@ -96,33 +298,90 @@ class DQN(nn.Module):
         x = F.relu(self.fc2(x))
         return self.fc3(x)
 
-# Function to preprocess data
-def preprocess_data(data):
-    # Convert data to appropriate formats
-    data_df = pd.DataFrame(data[1:], columns=data[0])
+# Function to parse timestamps with the sheet's known format
+def parse_timestamps(values):
+    timestamps = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce')
 
-    # Convert numerical columns, coercing errors to NaN
-    for col in ['Temperature', 'Humidity', 'Gas']:
-        data_df[col] = pd.to_numeric(data_df[col], errors='coerce')  # Handle invalid values
+    # Only rows that don't match the expected format pay for format inference
+    unmatched = timestamps.isna() & values.notna()
+    if unmatched.any():
+        timestamps[unmatched] = pd.to_datetime(values[unmatched], format='mixed', errors='coerce')
+
+    return timestamps
+
+# Function to convert a block of raw sheet rows into typed columns.
+# Returns the valid rows, indexed by their offset in the sheet, and drop counts per reason.
+def parse_rows(header, rows, offset=0):
+    raw = pd.DataFrame(rows, columns=header)
+    raw.index = pd.RangeIndex(offset, offset + len(raw))
 
-    # Drop rows with NaN in critical sensor columns
-    data_df.dropna(subset=['Temperature', 'Humidity', 'Gas'], inplace=True)
+    data_df = pd.DataFrame({'Timestamp': parse_timestamps(raw['Timestamp'])}, index=raw.index)
+
+    # Convert numerical columns, coercing errors to NaN
+    for col in SENSOR_COLUMNS:
+        data_df[col] = pd.to_numeric(raw[col], errors='coerce').astype(np.float32)
+
+    # Status codes come straight from the categorical; unknown statuses are -1
+    data_df['Status'] = pd.Categorical(raw['Status'], categories=list(STATUS_CODES))
+    data_df['StatusCode'] = data_df['Status'].cat.codes
+
+    invalid_sensor = data_df[SENSOR_COLUMNS].isna().any(axis=1)
+    invalid_timestamp = data_df['Timestamp'].isna() & ~invalid_sensor
+    dropped = {
+        'invalid_sensor': int(invalid_sensor.sum()),
+        'invalid_timestamp': int(invalid_timestamp.sum())
+    }
+
+    return data_df[~(invalid_sensor | invalid_timestamp)], dropped
+
+# Function to parse raw rows lazily, one block at a time (streaming mode)
+def iter_parsed_chunks(header, rows, chunk_size=PARSE_CHUNK_SIZE):
+    rows = iter(rows)
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield parse_rows(header, chunk, offset)
+        offset += len(chunk)
+
+# Function to preprocess raw rows from any iterable (e.g. a generator over a large export)
+def preprocess_rows(header, rows, chunk_size=PARSE_CHUNK_SIZE):
+    chunks = []
+    dropped = Counter()
+    for chunk_df, chunk_dropped in iter_parsed_chunks(header, rows, chunk_size):
+        chunks.append(chunk_df)
+        dropped.update(chunk_dropped)
 
     # Proceed only if there's data remaining
+    data_df = pd.concat(chunks) if chunks else pd.DataFrame()
     if data_df.empty:
         raise ValueError("No valid data remaining after preprocessing.")
 
     # Create time feature (hours since storage)
-    data_df['Timestamp'] = pd.to_datetime(data_df['Timestamp'])
-    data_df = data_df.sort_values('Timestamp')
-    data_df['TimeSinceStart'] = (data_df['Timestamp'] - data_df['Timestamp'].min()).dt.total_seconds() / 3600
+    data_df = data_df.sort_values('Timestamp', kind='stable')
+    data_df['TimeSinceStart'] = ((data_df['Timestamp'] - data_df['Timestamp'].min()).dt.total_seconds() / 3600).astype(np.float32)
 
-    # One-hot encode status
-    status_map = {'Normal': 0, 'At Risk': 1, 'Spoiled': 2}
-    data_df['StatusCode'] = data_df['Status'].map(status_map)
+    data_df.attrs['dropped_rows'] = dict(dropped)
+    if sum(dropped.values()):
+        print(f"Dropped rows during preprocessing: {dict(dropped)}")
 
     return data_df
 
+# Function to preprocess data (first row of data is the sheet header)
+def preprocess_data(data, chunk_size=PARSE_CHUNK_SIZE):
+    return preprocess_rows(data[0], itertools.islice(data, 1, None), chunk_size)
+
+# Function to turn preprocessed data into arrays the training loop can index directly
+def build_feature_matrix(data_df):
+    # Rows stay in timestamp order, so sorted row indices are sorted by TimeSinceStart
+    features = data_df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+
+    # Unknown statuses are coded -1
+    status_codes = data_df['StatusCode'].fillna(-1).to_numpy(dtype=np.int64)
+
+    return features, status_codes
+
 # Function to calculate reward based on food status and action
 def calculate_reward(status, action):
     # Action: 0 = Keep, 1 = Market, 2 = Food Bank/NGO
@@ -151,6 +410,11 @@ def calculate_reward(status, action):
         else:  # Send to NGO
             return 1
 
+# Reward for every (status code, action) pair, indexed as REWARD_TABLE[status, action].
+# Unknown statuses are coded -1, which indexes the last (Spoiled) row like calculate_reward does.
+REWARD_TABLE = torch.tensor([[calculate_reward(status, action) for action in range(3)]
+                             for status in STATUS_CODES], dtype=torch.float32)
+
 # Function to get action from epsilon-greedy policy
 def select_action(state, policy_net, steps_done, n_actions=3):
     sample = random.random()
@@ -162,132 +426,300 @@ def select_action(state, policy_net, steps_done, n_actions=3):
     else:
         return torch.tensor([[random.randrange(n_actions)]], dtype=torch.long)
 
+# Function to get epsilon-greedy actions for a batch of states in one forward pass
+def select_actions(states, policy_net, steps_done, n_actions=3):
+    eps_threshold = EPS_END + (EPS_START - EPS_END) * np.exp(-1. * steps_done / EPS_DECAY)
+
+    with torch.no_grad():
+        greedy_actions = policy_net(states).max(1)[1]
+    random_actions = torch.randint(n_actions, greedy_actions.shape)
+    explore = torch.rand(greedy_actions.shape) <= eps_threshold
+
+    return torch.where(explore, random_actions, greedy_actions).view(-1, 1)
+
 # Function to optimize model
-def optimize_model(policy_net, target_net, optimizer, memory):
+def optimize_model(policy_net, target_net, optimizer, memory, profiler=None):
     if len(memory) < BATCH_SIZE:
         return 0
 
-    transitions = memory.sample(BATCH_SIZE)
-    batch = Transition(*zip(*transitions))
+    profiler = profiler or TrainingProfiler(enabled=False)
+    prioritized = isinstance(memory, PrioritizedReplayMemory)
+
+    with profiler.phase('sample'):
+        if prioritized:
+            batch, indices, weights = memory.sample(BATCH_SIZE)
+        else:
+            batch = memory.sample(BATCH_SIZE)
+
+    with profiler.phase('forward'):
+        state_action_values = policy_net(batch.state).gather(1, batch.action)
+
+        # Terminal transitions contribute no bootstrapped value
+        with torch.no_grad():
+            next_state_values = target_net(batch.next_state).max(1)[0]
+        next_state_values = next_state_values.masked_fill(batch.done, 0.0)
+
+        expected_state_action_values = (next_state_values * GAMMA) + batch.reward
+
+        if prioritized:
+            # Weight each sample's loss by its importance-sampling weight and
+            # refresh priorities from the new TD errors
+            elementwise_loss = F.smooth_l1_loss(state_action_values, expected_state_action_values.unsqueeze(1),
+                                                reduction='none').squeeze(1)
+            loss = (elementwise_loss * weights).mean()
+            memory.update_priorities(indices, (state_action_values.squeeze(1) - expected_state_action_values).detach())
+        else:
+            loss = F.smooth_l1_loss(state_action_values, expected_state_action_values.unsqueeze(1))
 
-    non_final_mask = torch.tensor(tuple(map(lambda s: s is not None, batch.next_state)), dtype=torch.bool)
-    non_final_next_states = torch.cat([s for s in batch.next_state if s is not None])
+    with profiler.phase('backward'):
+        optimizer.zero_grad()
+        loss.backward()
+        for param in policy_net.parameters():
+            param.grad.data.clamp_(-1, 1)
+        optimizer.step()
 
-    state_batch = torch.cat(batch.state)
-    action_batch = torch.cat(batch.action)
-    reward_batch = torch.cat(batch.reward)
+    return loss.item()
 
-    state_action_values = policy_net(state_batch).gather(1, action_batch)
+# Function to play one batch of episodes in lockstep, optimizing after every step.
+# episode_idx holds one time-ordered row of feature-matrix indices per environment.
+def run_episode(policy_net, target_net, optimizer, memory, features, status_codes,
+                episode_idx, steps_done, profiler):
+    num_envs, episode_length = episode_idx.shape
+
+    with profiler.phase('rollout'):
+        episode_states = torch.from_numpy(features[episode_idx])
+        episode_status = torch.from_numpy(status_codes[episode_idx])
+    total_reward = 0
+    losses = []
+    correct_actions = 0
+
+    for t in range(episode_length - 1):
+        # Select and perform an action in every environment
+        with profiler.phase('act'):
+            state = episode_states[:, t]
+            action = select_actions(state, policy_net, steps_done)
+            steps_done += num_envs
+
+        with profiler.phase('rollout'):
+            # Move to next state
+            next_state = episode_states[:, t + 1]
 
-    next_state_values = torch.zeros(BATCH_SIZE)
-    next_state_values[non_final_mask] = target_net(non_final_next_states).max(1)[0].detach()
+            # Get status and look up rewards
+            status = episode_status[:, t + 1]
+            reward = REWARD_TABLE[status, action.squeeze(1)]
 
-    expected_state_action_values = (next_state_values * GAMMA) + reward_batch
+            total_reward += reward.sum().item()
 
-    loss = F.smooth_l1_loss(state_action_values, expected_state_action_values.unsqueeze(1))
+            # Correct action code matches the status code
+            # (Normal -> keep in storage, At Risk -> market, Spoiled -> NGO)
+            correct_actions += (action.squeeze(1) == status.clamp(min=0)).sum().item()
 
-    optimizer.zero_grad()
-    loss.backward()
-    for param in policy_net.parameters():
-        param.grad.data.clamp_(-1, 1)
-    optimizer.step()
+            # Store the transitions in memory
+            memory.push(state, action, next_state, reward)
 
-    return loss.item()
+        # Perform one step of the optimization
+        loss = optimize_model(policy_net, target_net, optimizer, memory, profiler)
+        if loss > 0:
+            losses.append(loss)
+
+        # Update the target network
+        if t % TARGET_UPDATE == 0:
+            with profiler.phase('target_sync'):
+                target_net.load_state_dict(policy_net.state_dict())
+
+    return total_reward, losses, correct_actions, steps_done
+
+# Function to find the epoch seconds at which TimeSinceStart is 0 for this data, so
+# servers can turn a live reading's timestamp into the feature the model was trained on
+def time_origin(data_df):
+    first = data_df.iloc[0]
+    return (first['Timestamp'] - pd.Timestamp(0)).total_seconds() - float(first['TimeSinceStart']) * 3600
+
+# Function to save model weights; the file is replaced rather than rewritten in place,
+# since the model registry memory-maps the files it serves
+def save_model_state(state_dict, path):
+    torch.save(state_dict, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+# Function to persist everything the next cycle needs to continue training
+def save_training_state(policy_net, optimizer, memory, steps_done, cycle, row_count):
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    torch.save({
+        'cycle': cycle,
+        'row_count': row_count,
+        'steps_done': steps_done,
+        'policy_net': policy_net.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'memory': memory.state_dict()
+    }, TRAINING_STATE_PATH)
+    print(f"Training state saved to {TRAINING_STATE_PATH}")
+
+# Function to load the previous cycle's training state
+def load_training_state():
+    if not os.path.exists(TRAINING_STATE_PATH):
+        return None
+
+    try:
+        return torch.load(TRAINING_STATE_PATH)
+    except Exception as e:
+        print(f"Could not load training state from {TRAINING_STATE_PATH}: {e}")
+        return None
 
 # Main training function
-def train_model(data_df, cycle):
+def train_model(data_df, cycle, num_envs=NUM_ENVS, warm_start=INCREMENTAL_TRAINING,
+                prioritized_replay=PRIORITIZED_REPLAY, profile_trace=PROFILE_TRACE,
+                time_budget=TRAINING_TIME_BUDGET, progress_callback=None):
+    # progress_callback(episode_metrics) runs after every episode; raising from it
+    # abandons the cycle (the training worker uses this for cancellation)
+
     # Initialize models
     input_size = 4  # [temperature, humidity, gas, time_since_storage]
     output_size = 3  # [keep, market, NGO]
 
     policy_net = DQN(input_size, output_size)
     target_net = DQN(input_size, output_size)
-    target_net.load_state_dict(policy_net.state_dict())
-    target_net.eval()
 
     optimizer = optim.RMSprop(policy_net.parameters())
-    memory = ReplayMemory(MEMORY_SIZE)
+    memory_class = PrioritizedReplayMemory if prioritized_replay else ReplayMemory
+    memory = memory_class(MEMORY_SIZE)
 
     steps_done = 0
-    num_episodes = 50
-    metrics = []
+    new_row_start = 0
 
-    for i_episode in range(num_episodes):
-        # Initialize environment
-        episode_data = data_df.sample(n=10).sort_values('TimeSinceStart')
-        current_idx = 0
-        total_reward = 0
-        losses = []
-        correct_actions = 0
-
-        state = torch.tensor([episode_data.iloc[current_idx][['Temperature', 'Humidity', 'Gas', 'TimeSinceStart']].values],
-                             dtype=torch.float32)
-
-        for t in range(len(episode_data) - 1):
-            # Select and perform an action
-            action = select_action(state, policy_net, steps_done)
-            steps_done += 1
+    # Continue from the previous cycle instead of retraining from scratch
+    if warm_start:
+        state = load_training_state()
+        if state is not None:
+            try:
+                policy_net.load_state_dict(state['policy_net'])
+                optimizer.load_state_dict(state['optimizer'])
+                memory.load_state_dict(state['memory'])
+                steps_done = state['steps_done']
+                new_row_start = state['row_count']
+                print(f"Warm-starting from cycle {state['cycle']} "
+                      f"({len(memory)} stored transitions, {new_row_start} rows already seen)")
+            except (KeyError, RuntimeError, ValueError) as e:
+                print(f"Ignoring incompatible training state: {e}")
+                policy_net = DQN(input_size, output_size)
+                optimizer = optim.RMSprop(policy_net.parameters())
+                memory = memory_class(MEMORY_SIZE)
+                steps_done = 0
+                new_row_start = 0
 
-            # Move to next state
-            current_idx += 1
-            next_state = torch.tensor([episode_data.iloc[current_idx][['Temperature', 'Humidity', 'Gas', 'TimeSinceStart']].values],
-                                      dtype=torch.float32)
+    target_net.load_state_dict(policy_net.state_dict())
+    target_net.eval()
 
-            # Get status and calculate reward
-            status = episode_data.iloc[current_idx]['Status']
-            reward_val = calculate_reward(status, action.item())
-            reward = torch.tensor([reward_val], dtype=torch.float32)
+    prepare_start = time.perf_counter()
+    features, status_codes = build_feature_matrix(data_df)
+    rng = np.random.default_rng()
+    print(f"Built feature matrix for {len(features)} rows in {time.perf_counter() - prepare_start:.3f}s")
 
-            total_reward += reward_val
+    profiler = TrainingProfiler(enabled=PROFILE_TRAINING)
+    if profile_trace:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        profiler.start_trace(os.path.join(TRACE_DIR, f'trace_cycle_{cycle}.json'))
 
-            # Determine correct action based on status
-            correct_action = 0  # Keep in storage
-            if status == 'At Risk':
-                correct_action = 1  # Send to market
-            elif status == 'Spoiled':
-                correct_action = 2  # Send to NGO
+    # The DataFrame index is the row's position in the sheet, so rows at or past
+    # new_row_start arrived after the previous cycle
+    all_rows = np.arange(len(features))
+    new_rows = np.flatnonzero(data_df.index.to_numpy() >= new_row_start)
+    if len(new_rows) < EPISODE_LENGTH:
+        new_rows = all_rows
+    row_count = int(data_df.index.max()) + 1
 
-            if action.item() == correct_action:
-                correct_actions += 1
+    # Create models directory if it doesn't exist
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    model_path = os.path.join(MODELS_DIR, f'food_monitoring_model_cycle_{cycle}.pth')
+    # In-progress checkpoints get their own name, so the registry never serves an unfinished cycle
+    checkpoint_path = model_path + '.partial'
 
-            # Store the transition in memory
-            memory.push(state, action, next_state, reward)
+    num_episodes = MAX_EPISODES
+    metrics = []
+    monitor = ConvergenceMonitor(window=CONVERGENCE_WINDOW, min_episodes=MIN_EPISODES,
+                                 loss_tolerance=LOSS_TOLERANCE, accuracy_tolerance=ACCURACY_TOLERANCE,
+                                 target_accuracy=TARGET_ACCURACY, time_budget=time_budget)
+    best_state = None
 
-            # Move to the next state
-            state = next_state
+    for i_episode in range(num_episodes):
+        profiler.start_episode()
 
-            # Perform one step of the optimization
-            loss = optimize_model(policy_net, target_net, optimizer, memory)
-            if loss > 0:
-                losses.append(loss)
+        with profiler.phase('rollout'):
+            # Initialize environments: each row is a time-ordered sample of row indices
+            episode_idx = np.sort([rng.choice(new_rows if rng.random() < NEW_DATA_FRACTION else all_rows,
+                                              size=EPISODE_LENGTH, replace=False)
+                                   for _ in range(num_envs)], axis=1)
 
-            # Update the target network
-            if t % TARGET_UPDATE == 0:
-                target_net.load_state_dict(policy_net.state_dict())
+        total_reward, losses, correct_actions, steps_done = run_episode(
+            policy_net, target_net, optimizer, memory, features, status_codes,
+            episode_idx, steps_done, profiler)
 
         # Calculate episode metrics
+        # Reward is reported per environment so it stays comparable across num_envs
         avg_loss = np.mean(losses) if losses else 0
-        accuracy = correct_actions / (len(episode_data) - 1) * 100
+        total_reward /= num_envs
+        accuracy = correct_actions / (num_envs * (EPISODE_LENGTH - 1)) * 100
 
         print(f"Episode {i_episode+1}/{num_episodes} - "
               f"Loss: {avg_loss:.4f}, Reward: {total_reward:.2f}, Accuracy: {accuracy:.2f}%")
 
-        # Save metrics
+        # Save metrics, followed by the episode's profile columns
         metrics.append({
             'epoch': i_episode + 1,
             'loss': avg_loss,
             'reward': total_reward,
             'accuracy': accuracy,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **profiler.end_episode(EPISODE_LENGTH - 1, num_envs * (EPISODE_LENGTH - 1))
         })
 
-    # Create models directory if it doesn't exist
-    os.makedirs('models', exist_ok=True)
-    
-    # Save model
-    model_path = f'models/food_monitoring_model_cycle_{cycle}.pth'
-    torch.save(policy_net.state_dict(), model_path)
-    print(f"Model saved to {model_path}")
+        # Checkpoint the best model so far, so it can be recovered if the process dies
+        if monitor.update(avg_loss, accuracy):
+            best_state = {name: tensor.clone() for name, tensor in policy_net.state_dict().items()}
+            save_model_state(best_state, checkpoint_path)
+
+        if progress_callback is not None:
+            try:
+                progress_callback(metrics[-1])
+            except Exception:
+                # The cycle is abandoned, so its checkpoint must not be published
+                profiler.stop_trace()
+                if os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+                raise
+
+        stop_reason = monitor.should_stop()
+        if stop_reason:
+            print(f"Stopping after {i_episode+1} episodes: {stop_reason}")
+            break
+
+    profiler.stop_trace()
+
+    # Save the best model seen during the cycle
+    if best_state is not None:
+        final_state = {name: tensor.clone() for name, tensor in policy_net.state_dict().items()}
+        policy_net.load_state_dict(best_state)
+    save_model_state(policy_net.state_dict(), model_path)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if monitor.best_accuracy is not None:
+        print(f"Model saved to {model_path} (best moving accuracy {monitor.best_accuracy:.2f}%)")
+    else:
+        print(f"Model saved to {model_path}")
+
+    # Export a torch-free copy, checking its decisions against real training rows
+    try:
+        check_rows = rng.choice(len(features), size=min(AGREEMENT_SAMPLES, len(features)), replace=False)
+        export_checked(policy_net, os.path.splitext(model_path)[0] + WEIGHT_FILE_SUFFIX,
+                       EXPORT_WEIGHT_MODE, inputs=features[check_rows], time_origin=time_origin(data_df))
+    except Exception as e:
+        print(f"Failed to export NumPy weights: {e}")
+
+    # Warm-start from where training stopped, not from the best checkpoint
+    if best_state is not None:
+        policy_net.load_state_dict(final_state)
+
+    # Save what the next cycle needs to warm-start
+    save_training_state(policy_net, optimizer, memory, steps_done, cycle, row_count)
 
     return metrics
 
@@ -357,13 +789,52 @@ def update_local_cycle(cycle):
     with open('training_cycle.txt', 'w') as f:
         f.write(str(cycle))
 
+# Function to pull rows added to the sheet since the last poll into the local cache
+def sync_sensor_data(cache, sensor_data_sheet):
+    header, new_rows = cache.fetch_new_rows(sensor_data_sheet)
+    if not new_rows:
+        return 0
+
+    # Only the new rows are preprocessed; index them by their offset in the sheet
+    try:
+        new_df = preprocess_data([header] + new_rows)
+        new_df.index += cache.row_count
+    except ValueError:
+        new_df = None
+
+    cache.append(new_df, len(new_rows))
+    return len(new_rows)
+
+def run_training_cycle(cache, cycle, progress_callback=None):
+    """Train one cycle on everything in the local cache and record its metrics"""
+    print(f"Starting training cycle {cycle}")
+
+    # Load preprocessed data from the local cache
+    data_df = cache.load()
+    if data_df.empty:
+        raise ValueError("No valid data remaining after preprocessing.")
+
+    # Train model
+    metrics = train_model(data_df, cycle, progress_callback=progress_callback)
+
+    # Save metrics
+    save_metrics_to_sheet(metrics, cycle)
+
+    print(f"Completed training cycle {cycle}")
+    return metrics
+
 # Main execution loop
 def main():
+    parser = argparse.ArgumentParser(description="Train the food monitoring DQN from SensorData")
+    parser.add_argument('--once', action='store_true',
+                        help="Sync and train a single cycle, then exit (used by the web app's job queue)")
+    args = parser.parse_args()
+
     # Setup Google Sheets connection
     gc = setup_google_sheets()
     if gc is None:
         print("Failed to set up Google Sheets authentication. Exiting.")
-        return
+        return 1
     
     try:
         # Open the spreadsheet
@@ -380,41 +851,43 @@ def main():
         print("1. Your service account credentials are correct")
         print("2. The service account has been granted access to the spreadsheet")
         print("3. The spreadsheet URL is correct")
-        return
+        return 1
 
     # Get current training cycle
     current_cycle = get_existing_metrics()
     last_entry_count = 0
 
+    cache = SensorCache(SENSOR_CACHE_PATH)
+    print(f"Using local sensor cache {SENSOR_CACHE_PATH} ({cache.row_count} rows already synced)")
+
+    if args.once:
+        try:
+            sync_sensor_data(cache, sensor_data_sheet)
+            run_training_cycle(cache, current_cycle + 1)
+        except Exception as e:
+            print(f"Error during training: {e}")
+            return 1
+        return 0
+
     print(f"Starting monitoring for training. Current cycle: {current_cycle}")
     print(f"Will begin training when sensor data reaches {MIN_ENTRIES} entries.")
 
     while True:
         try:
-            # Get current sensor data
-            sensor_data = sensor_data_sheet.get_all_values()
-            current_entry_count = len(sensor_data) - 1  # Subtract header row
+            # Fetch only rows added since the last poll
+            sync_sensor_data(cache, sensor_data_sheet)
+            current_entry_count = cache.row_count
 
             print(f"Current entries: {current_entry_count}, Last checked: {last_entry_count}")
 
             # Check if we've collected enough new data for training
             if current_entry_count >= last_entry_count + MIN_ENTRIES:
                 current_cycle += 1
-                print(f"Starting training cycle {current_cycle}")
-
-                # Preprocess data
-                data_df = preprocess_data(sensor_data)
-
-                # Train model
-                metrics = train_model(data_df, current_cycle)
-
-                # Save metrics
-                save_metrics_to_sheet(metrics, current_cycle)
+                run_training_cycle(cache, current_cycle)
 
                 # Update last entry count
                 last_entry_count = current_entry_count
 
-                print(f"Completed training cycle {current_cycle}")
                 print(f"Waiting for {MIN_ENTRIES} more entries before next cycle")
 
         except Exception as e:
@@ -425,4 +898,4 @@ def main():
         time.sleep(60)  # Check every minute
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,228 @@
+# Food Monitoring System - NumPy DQN Inference
+# Exports a trained DQN state_dict to a compact weight file and evaluates the
+# 4 -> 128 -> 128 -> 3 MLP with plain NumPy, so serving processes never import torch.
+#
+# Weight file layout (.dqnw):
+#   b'DQNW' | uint32 header length | JSON header | tensors, each 64-byte aligned
+# The header lists every tensor's dtype, shape, offset and (for int8) per-row scales,
+# so files can be memory-mapped and used without copying. It also records the
+# training data's time origin (epoch seconds where TimeSinceStart is 0), so
+# servers can derive TimeSinceStart from a reading's timestamp.
+#
+# Usage: python numpy_dqn.py models/food_monitoring_model_cycle_3.pth --mode int8
+
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+WEIGHT_FILE_MAGIC = b'DQNW'
+WEIGHT_FILE_SUFFIX = '.dqnw'
+WEIGHT_MODES = ('float32', 'float16', 'int8')
+LAYERS = ('fc1', 'fc2', 'fc3')
+ALIGNMENT = 64
+MIN_AGREEMENT = 0.99  # Share of inputs whose chosen action must match the torch model
+
+# Plausible sensor ranges used when no real readings are given for the agreement check
+SAMPLE_RANGES = {
+    'Temperature': (-5.0, 45.0),
+    'Humidity': (0.0, 100.0),
+    'Gas': (0.0, 1000.0),
+    'TimeSinceStart': (0.0, 2000.0)
+}
+
+
+def _to_numpy(tensor):
+    if hasattr(tensor, 'detach'):
+        tensor = tensor.detach().cpu().numpy()
+    return np.asarray(tensor, dtype=np.float32)
+
+
+def export_weights(state_dict, path, mode='float32', time_origin=None):
+    """Write a DQN state_dict (torch tensors or arrays) to a .dqnw weight file"""
+    if mode not in WEIGHT_MODES:
+        raise ValueError(f"Unknown weight mode {mode!r}; expected one of {WEIGHT_MODES}")
+
+    tensors = []
+    for layer in LAYERS:
+        weight = _to_numpy(state_dict[f'{layer}.weight'])
+        bias = _to_numpy(state_dict[f'{layer}.bias'])
+
+        if mode == 'int8':
+            # Symmetric per-output-row quantization
+            scale = np.abs(weight).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            weight = np.clip(np.round(weight / scale[:, None]), -127, 127).astype(np.int8)
+            tensors.append((f'{layer}.weight', weight, scale.astype(np.float32).tolist()))
+        else:
+            tensors.append((f'{layer}.weight', weight.astype(mode), None))
+
+        # Biases are tiny, so they always stay float32
+        tensors.append((f'{layer}.bias', bias, None))
+
+    entries = []
+    offset = 0
+    for name, array, scale in tensors:
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entry = {'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        if scale is not None:
+            entry['scale'] = scale
+        entries.append(entry)
+        offset += array.nbytes
+
+    header = {'version': 1, 'mode': mode, 'tensors': entries}
+    if time_origin is not None:
+        header['time_origin'] = float(time_origin)
+    header = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(WEIGHT_FILE_MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    # Write a new file and rename it over the old one: readers memory-map these files,
+    # and rewriting one in place would change (or truncate) weights under their mappings
+    with open(path + '.tmp', 'wb') as f:
+        f.write(WEIGHT_FILE_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for entry, (_, array, _) in zip(entries, tensors):
+            f.seek(data_start + entry['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(path + '.tmp', path)
+
+    return path
+
+
+def load_weights(path, mmap=True):
+    """Read a .dqnw file; returns (mode, {name: array}, {name: scales}, time_origin).
+
+    With mmap=True the arrays are read-only views into a memory map of the file.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(WEIGHT_FILE_MAGIC)) != WEIGHT_FILE_MAGIC:
+            raise ValueError(f"{path} is not a DQN weight file")
+        header_length = struct.unpack('<I', f.read(4))[0]
+        header = json.loads(f.read(header_length).decode('utf-8'))
+
+    data_start = -(-(len(WEIGHT_FILE_MAGIC) + 4 + header_length) // ALIGNMENT) * ALIGNMENT
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        with open(path, 'rb') as f:
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+
+    arrays = {}
+    scales = {}
+    for entry in header['tensors']:
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        start = data_start + entry['offset']
+        arrays[entry['name']] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+        if 'scale' in entry:
+            scales[entry['name']] = np.asarray(entry['scale'], dtype=np.float32)
+
+    return header['mode'], arrays, scales, header.get('time_origin')
+
+
+class NumpyDQN:
+    """float32 weights are used in place (views into the memory map); int8 and float16
+    weights are dequantized to float32 once here, so forward passes never convert them.
+    The reduced-precision modes therefore shrink the files, not the resident model."""
+
+    def __init__(self, arrays, scales=None, mode='float32', time_origin=None):
+        self.mode = mode
+        self.time_origin = time_origin  # None for weights exported without one
+        self.layers = []
+        scales = scales or {}
+        for layer in LAYERS:
+            name = f'{layer}.weight'
+            # Weights are stored (out, in) like torch; keep the transpose as a view
+            weight = arrays[name].T
+            if weight.dtype != np.float32:
+                weight = np.array(weight, dtype=np.float32)
+                if name in scales:
+                    # Per-output-row int8 scales apply to the columns of the transpose
+                    weight *= scales[name]
+            self.layers.append((weight, arrays[f'{layer}.bias']))
+
+    @classmethod
+    def from_file(cls, path, mmap=True):
+        mode, arrays, scales, time_origin = load_weights(path, mmap=mmap)
+        return cls(arrays, scales, mode, time_origin)
+
+    def forward(self, x):
+        """Q-values for an (n, 4) batch of states"""
+        x = np.asarray(x, dtype=np.float32)
+        for i, (weight, bias) in enumerate(self.layers):
+            x = x @ weight
+            x += bias
+            if i < len(self.layers) - 1:
+                np.maximum(x, 0, out=x)
+        return x
+
+    __call__ = forward
+
+    @property
+    def nbytes(self):
+        return sum(weight.nbytes + bias.nbytes for weight, bias in self.layers)
+
+
+def sample_inputs(n=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    low, high = zip(*SAMPLE_RANGES.values())
+    return rng.uniform(low, high, size=(n, len(SAMPLE_RANGES))).astype(np.float32)
+
+
+def action_agreement(torch_model, numpy_model, inputs):
+    """Share of inputs where the NumPy model picks the same action as the torch DQN"""
+    import torch
+
+    torch_model.eval()
+    with torch.no_grad():
+        expected = torch_model(torch.from_numpy(inputs)).argmax(1).numpy()
+
+    return float(np.mean(numpy_model(inputs).argmax(1) == expected))
+
+
+def export_checked(torch_model, path, mode='float32', inputs=None, time_origin=None):
+    """Export a torch DQN's weights, falling back to float32 if a reduced-precision
+    mode changes the chosen action for too many inputs"""
+    if inputs is None:
+        inputs = sample_inputs()
+
+    # Check the export before it replaces the served file
+    staged = path + '.check'
+    export_weights(torch_model.state_dict(), staged, mode, time_origin)
+    agreement = action_agreement(torch_model, NumpyDQN.from_file(staged, mmap=False), inputs)
+    print(f"Checked {mode} weights: action agreement with torch {agreement:.2%}")
+
+    if agreement < MIN_AGREEMENT and mode != 'float32':
+        os.remove(staged)
+        print(f"Agreement below {MIN_AGREEMENT:.0%}; exporting float32 weights instead")
+        return export_checked(torch_model, path, 'float32', inputs, time_origin)
+
+    os.replace(staged, path)
+    print(f"Exported {mode} weights to {path}")
+    return path, mode, agreement
+
+
+def main():
+    import torch
+    from deepq_reinforcement import DQN
+
+    parser = argparse.ArgumentParser(description="Export a trained DQN for torch-free inference")
+    parser.add_argument('model', help="Path to a food_monitoring_model_cycle_N.pth state_dict")
+    parser.add_argument('--mode', choices=WEIGHT_MODES, default='float32')
+    parser.add_argument('--output', help="Weight file to write (default: next to the model)")
+    parser.add_argument('--time-origin', type=float,
+                        help="Epoch seconds of the training data's first reading (TimeSinceStart = 0), "
+                             "so readings can be scored by timestamp")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + WEIGHT_FILE_SUFFIX
+    model = DQN(4, 3)
+    model.load_state_dict(torch.load(args.model, map_location='cpu'))
+    export_checked(model, output, args.mode, time_origin=args.time_origin)
+
+
+if __name__ == "__main__":
+    main()
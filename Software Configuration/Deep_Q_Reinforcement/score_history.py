@@ -0,0 +1,163 @@
+# Food Monitoring System - Offline History Scoring
+# Scores every cached SensorData reading with one or more trained cycles in a single
+# pass, streaming the SQLite cache in chunks and evaluating each chunk with the NumPy
+# engine. Reports per-cycle action distributions, agreement with the recorded Status
+# and the cumulative reward, and writes per-reading decisions to a Parquet file
+# (CSV when pyarrow is not installed).
+#
+# Usage: python score_history.py --cycles 3 4 --output metrics/history_scores.parquet
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from deepq_reinforcement import (
+    MODELS_DIR, SENSOR_CACHE_PATH, PARSE_CHUNK_SIZE, REWARD_TABLE, build_feature_matrix
+)
+from numpy_dqn import NumpyDQN, WEIGHT_FILE_SUFFIX
+from sensor_cache import SensorCache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ACTIONS = ['Keep', 'Market', 'NGO']
+
+
+def load_cycle_model(cycle, models_dir=MODELS_DIR):
+    """NumPy engine for a trained cycle, preferring exported weights over the .pth"""
+    base = os.path.join(models_dir, f'food_monitoring_model_cycle_{cycle}')
+    if os.path.exists(base + WEIGHT_FILE_SUFFIX):
+        return NumpyDQN.from_file(base + WEIGHT_FILE_SUFFIX)
+    if not os.path.exists(base + '.pth'):
+        raise FileNotFoundError(f"No model for cycle {cycle} in {models_dir}")
+
+    import torch
+    state_dict = torch.load(base + '.pth', map_location='cpu')
+    return NumpyDQN({name: tensor.numpy() for name, tensor in state_dict.items()})
+
+
+class ScoreWriter:
+    """Appends scored chunks to one Parquet file, or to a CSV without pyarrow"""
+
+    def __init__(self, path):
+        if pa is None and path.endswith('.parquet'):
+            path = path[:-len('.parquet')] + '.csv'
+            print(f"pyarrow is not installed; writing CSV to {path}")
+        self.path = path
+        self.writer = None
+        self.first = True
+
+    def write(self, frame):
+        if pa is not None and self.path.endswith('.parquet'):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def score_history(cache, models, chunk_size=PARSE_CHUNK_SIZE, writer=None):
+    """Score all cached readings with every model; returns one summary dict per cycle"""
+    reward_table = REWARD_TABLE.numpy()
+    totals = {cycle: {'actions': np.zeros(len(ACTIONS), dtype=np.int64),
+                      'agreed': 0, 'reward': 0.0} for cycle in models}
+    rows = 0
+    labelled = 0
+
+    for chunk in cache.iter_chunks(chunk_size):
+        features, status_codes = build_feature_matrix(chunk)
+        # Unknown statuses (-1) have no correct action, so they don't count towards agreement
+        known = status_codes >= 0
+        rows += len(chunk)
+        labelled += int(known.sum())
+
+        output = chunk[['Timestamp', 'Status']].copy()
+        output.insert(0, 'row', chunk.index)
+        for cycle, model in models.items():
+            actions = model(features).argmax(axis=1)
+            rewards = reward_table[status_codes, actions]
+
+            total = totals[cycle]
+            total['actions'] += np.bincount(actions, minlength=len(ACTIONS))
+            total['agreed'] += int((actions[known] == status_codes[known]).sum())
+            total['reward'] += float(rewards.sum())
+
+            output[f'action_cycle_{cycle}'] = actions.astype(np.int8)
+            output[f'reward_cycle_{cycle}'] = rewards
+
+        if writer is not None:
+            writer.write(output)
+
+    summaries = []
+    for cycle, total in totals.items():
+        summary = {'cycle': cycle, 'rows': rows, 'labelled_rows': labelled}
+        for name, count in zip(ACTIONS, total['actions']):
+            summary[f'share_{name.lower()}'] = count / rows if rows else 0.0
+        summary['agreement'] = total['agreed'] / labelled if labelled else 0.0
+        summary['cumulative_reward'] = total['reward']
+        summary['mean_reward'] = total['reward'] / rows if rows else 0.0
+        summaries.append(summary)
+    return summaries
+
+
+def save_summary(summaries, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(summaries[0].keys()))
+        writer.writeheader()
+        writer.writerows(summaries)
+    print(f"Scoring summary saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the cached SensorData history with trained cycles")
+    parser.add_argument('--cycles', type=int, nargs='+', required=True, help="Model cycles to compare")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--cache', default=SENSOR_CACHE_PATH, help="SQLite sensor cache to score")
+    parser.add_argument('--chunk-size', type=int, default=PARSE_CHUNK_SIZE)
+    parser.add_argument('--output', help="Per-reading decisions (.parquet, or .csv)")
+    parser.add_argument('--summary', help="CSV file for the per-cycle summary")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cache):
+        parser.error(f"Sensor cache {args.cache} not found; run the training script to populate it")
+
+    models = {cycle: load_cycle_model(cycle, args.models_dir) for cycle in args.cycles}
+    cache = SensorCache(args.cache)
+    writer = ScoreWriter(args.output) if args.output else None
+
+    start = time.perf_counter()
+    try:
+        summaries = score_history(cache, models, args.chunk_size, writer)
+    finally:
+        cache.close()
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {summaries[0]['rows']} readings with {len(models)} cycle(s) in {elapsed:.2f}s")
+    for summary in summaries:
+        shares = ", ".join(f"{name} {summary[f'share_{name.lower()}']:.1%}" for name in ACTIONS)
+        print(f"Cycle {summary['cycle']} - Actions: {shares}, "
+              f"Agreement: {summary['agreement']:.2%}, "
+              f"Cumulative reward: {summary['cumulative_reward']:.1f}")
+    if writer is not None:
+        print(f"Per-reading decisions saved to {writer.path}")
+
+    if args.summary:
+        save_summary(summaries, args.summary)
+
+
+if __name__ == "__main__":
+    main()
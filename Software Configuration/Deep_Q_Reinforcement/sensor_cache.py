@@ -0,0 +1,140 @@
+# Food Monitoring System - Local Sensor Data Cache
+# Keeps preprocessed SensorData rows in a local SQLite file together with a
+# row-offset cursor, so the training watcher only downloads rows it has not seen yet
+
+import sqlite3
+
+import pandas as pd
+
+# Rows requested from the sheet per call while catching up
+SYNC_PAGE_SIZE = 5000
+
+
+class SensorCache:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            # row is the reading's 0-based position below the sheet header;
+            # Timestamp is stored as seconds since the epoch
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS readings (
+                    row INTEGER PRIMARY KEY,
+                    Timestamp REAL NOT NULL,
+                    Temperature REAL NOT NULL,
+                    Humidity REAL NOT NULL,
+                    Gas REAL NOT NULL,
+                    Status TEXT,
+                    StatusCode INTEGER
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS readings_timestamp ON readings (Timestamp)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )""")
+
+    def _get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def row_count(self):
+        """Number of sheet data rows consumed so far (valid or not)"""
+        return int(self._get_state('row_count', 0))
+
+    @property
+    def header(self):
+        header = self._get_state('header')
+        return header.split('\t') if header else None
+
+    def fetch_new_rows(self, worksheet):
+        """Download only the sheet rows below the cursor, returning (header, rows)"""
+        header = self.header
+        if header is None:
+            header = worksheet.row_values(1)
+            with self.conn:
+                self._set_state('header', '\t'.join(header))
+
+        last_column = column_letter(len(header))
+        start = self.row_count + 2  # sheet rows are 1-based and row 1 is the header
+        rows = []
+        while True:
+            end = start + SYNC_PAGE_SIZE - 1
+            page = worksheet.get_values(f"A{start}:{last_column}{end}")
+            rows.extend(page)
+            if len(page) < SYNC_PAGE_SIZE:
+                break
+            start = end + 1
+
+        return header, rows
+
+    def append(self, data_df, rows_consumed):
+        """Store preprocessed rows and advance the cursor past rows_consumed sheet rows.
+
+        data_df is indexed by sheet row offset; it may be None when none of the
+        consumed rows were valid.
+        """
+        with self.conn:
+            if data_df is not None and not data_df.empty:
+                timestamps = (data_df['Timestamp'] - pd.Timestamp(0)).dt.total_seconds()
+                status_codes = data_df['StatusCode'].astype('Int64')
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    zip(data_df.index.astype(int).tolist(),
+                        timestamps.tolist(),
+                        data_df['Temperature'].astype(float).tolist(),
+                        data_df['Humidity'].astype(float).tolist(),
+                        data_df['Gas'].astype(float).tolist(),
+                        data_df['Status'].tolist(),
+                        [None if pd.isna(code) else int(code) for code in status_codes]))
+            self._set_state('row_count', self.row_count + rows_consumed)
+
+    def load(self, since_row=0):
+        """Load cached readings as a preprocessed DataFrame indexed by sheet row offset.
+
+        TimeSinceStart is always measured from the earliest cached reading, so it
+        matches what preprocess_data would produce over the whole sheet.
+        """
+        data_df = pd.read_sql_query(
+            "SELECT * FROM readings WHERE row >= ? ORDER BY Timestamp, row",
+            self.conn, params=(since_row,), index_col='row')
+        return self._finish(data_df, self._start_time())
+
+    def iter_chunks(self, chunk_size=100000):
+        """Yield cached readings in sheet order, chunk_size rows at a time"""
+        start = self._start_time()
+        last_row = -1
+        while True:
+            chunk = pd.read_sql_query(
+                "SELECT * FROM readings WHERE row > ? ORDER BY row LIMIT ?",
+                self.conn, params=(last_row, chunk_size), index_col='row')
+            if chunk.empty:
+                return
+            last_row = int(chunk.index[-1])
+            yield self._finish(chunk, start)
+
+    def _start_time(self):
+        return self.conn.execute("SELECT MIN(Timestamp) FROM readings").fetchone()[0] or 0
+
+    @staticmethod
+    def _finish(data_df, start):
+        data_df['TimeSinceStart'] = (data_df['Timestamp'] - start) / 3600
+        data_df['Timestamp'] = pd.to_datetime(data_df['Timestamp'], unit='s')
+        data_df.index.name = None
+        return data_df
+
+    def close(self):
+        self.conn.close()
+
+
+def column_letter(n):
+    """Sheet column letters for a 1-based column number: 1 -> A, 26 -> Z, 27 -> AA"""
+    letters = ''
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
@@ -0,0 +1,149 @@
+# Food Monitoring System - Training Profiler
+# Records wall time per training phase, throughput and peak resident memory for
+# each episode, so regressions between training cycles show up in the metrics CSV
+
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Phases timed inside each episode
+PHASES = ('rollout', 'act', 'sample', 'forward', 'backward', 'target_sync')
+
+_NO_PHASE = nullcontext()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+
+    # Windows has no resource module
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB, or None if unavailable"""
+    try:
+        # Linux: resident pages are the second field
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's resident-memory high-water mark (Linux); False if unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def hwm_rss_mb():
+    """Resident-memory high-water mark since the last reset_peak_rss() (Linux), or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class TrainingProfiler:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phase_times = defaultdict(float)
+        self.episode_start = None
+        self.hwm_reset = False  # Whether this episode's peak comes from the kernel high-water mark
+        self.sampled_peak = None  # Otherwise, the highest RSS seen at phase boundaries
+        self.trace = None
+        self.trace_path = None
+
+    def phase(self, name):
+        """Context manager that adds the enclosed wall time to the named phase"""
+        if not self.enabled:
+            return _NO_PHASE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+            if not self.hwm_reset:
+                self._sample_rss()
+
+    def _sample_rss(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.sampled_peak is None or rss > self.sampled_peak):
+            self.sampled_peak = rss
+
+    def start_episode(self):
+        self.phase_times.clear()
+        self.sampled_peak = None
+        self.hwm_reset = self.enabled and reset_peak_rss()
+        if self.enabled and not self.hwm_reset:
+            self._sample_rss()
+        self.episode_start = time.perf_counter()
+
+    def end_episode(self, steps, transitions):
+        """Return the episode's profile as metric columns"""
+        if not self.enabled:
+            return {}
+
+        elapsed = time.perf_counter() - self.episode_start
+        columns = {f'time_{name}_s': self.phase_times.get(name, 0.0) for name in PHASES}
+        columns['episode_time_s'] = elapsed
+        columns['steps_per_sec'] = steps / elapsed if elapsed > 0 else 0.0
+        columns['transitions_per_sec'] = transitions / elapsed if elapsed > 0 else 0.0
+        # Peak RSS within this episode. The high-water mark is reset at the start of
+        # every episode; where that isn't possible, RSS sampled at every phase boundary
+        # stands in, which can miss peaks inside a phase
+        if self.hwm_reset:
+            columns['episode_peak_rss_mb'] = hwm_rss_mb()
+        else:
+            self._sample_rss()
+            columns['episode_peak_rss_mb'] = self.sampled_peak
+        return columns
+
+    def start_trace(self, trace_path):
+        """Start a torch.profiler trace that stop_trace() writes as a Chrome trace file"""
+        from torch.profiler import profile, ProfilerActivity
+
+        self.trace = profile(activities=[ProfilerActivity.CPU])
+        self.trace_path = trace_path
+        self.trace.start()
+
+    def stop_trace(self):
+        if self.trace is None:
+            return None
+
+        self.trace.stop()
+        self.trace.export_chrome_trace(self.trace_path)
+        self.trace = None
+        print(f"Profiler trace saved to {self.trace_path}")
+        return self.trace_path
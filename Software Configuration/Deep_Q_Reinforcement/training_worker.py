@@ -0,0 +1,198 @@
+# Food Monitoring System - Warm Training Worker
+# A long-lived training process for the web app's job queue. It imports torch and the
+# training code once, keeps its Google Sheets connection and SensorCache open, and then
+# trains one cycle per job it is sent, so a run no longer pays for interpreter start-up,
+# imports and authentication.
+#
+# Protocol, one JSON object per line:
+#   stdin:  {"job": "<id>"} trains a cycle, {"cancel": "<id>"} stops it after the current episode
+#   stdout: the usual training output, plus status lines starting with STATUS_PREFIX:
+#           {"job": "<id>" or null, "state": "ready" | "done" | "failed" | "cancelled", "message": ...}
+#
+# The web app only uses TrainingWorker (the parent side); torch is imported in the worker process.
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+STATUS_PREFIX = '@@training-worker '
+CANCEL_GRACE_S = 30  # Time a cancelled job gets to reach an episode boundary before the worker is killed
+POLL_INTERVAL_S = 0.5
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+def send_status(job_id, state, message=None):
+    print(STATUS_PREFIX + json.dumps({'job': job_id, 'state': state, 'message': message}), flush=True)
+
+
+def serve():
+    """Worker process main loop: read jobs from stdin and train one cycle for each"""
+    import deepq_reinforcement as dq
+
+    jobs = queue.Queue()
+    cancelled = set()
+
+    def read_commands():
+        for line in sys.stdin:
+            try:
+                command = json.loads(line)
+            except ValueError:
+                print(f"Ignoring malformed command: {line.strip()}")
+                continue
+            if 'cancel' in command:
+                cancelled.add(command['cancel'])
+            elif 'job' in command:
+                jobs.put(command['job'])
+        # stdin closes when the web app goes away
+        jobs.put(None)
+
+    threading.Thread(target=read_commands, name='commands', daemon=True).start()
+
+    def connect():
+        gc = dq.setup_google_sheets()
+        if gc is None:
+            raise RuntimeError("Failed to set up Google Sheets authentication")
+        return gc.open_by_url(dq.SPREADSHEET_URL).worksheet("SensorData")
+
+    cache = dq.SensorCache(dq.SENSOR_CACHE_PATH)
+    try:
+        sensor_data_sheet = connect()
+        print("Training worker connected to Google Sheets")
+    except Exception as e:
+        # Retried when the first job arrives
+        print(f"Error connecting to Google Sheets: {e}")
+        sensor_data_sheet = None
+    send_status(None, 'ready')
+
+    while True:
+        job_id = jobs.get()
+        if job_id is None:
+            break
+
+        def check_cancelled(episode_metrics=None):
+            if job_id in cancelled:
+                raise TrainingCancelled()
+
+        try:
+            check_cancelled()
+            if sensor_data_sheet is None:
+                sensor_data_sheet = connect()
+            dq.sync_sensor_data(cache, sensor_data_sheet)
+            check_cancelled()
+            dq.run_training_cycle(cache, dq.get_existing_metrics() + 1, progress_callback=check_cancelled)
+            send_status(job_id, 'done')
+        except TrainingCancelled:
+            print("Training cancelled")
+            send_status(job_id, 'cancelled')
+        except Exception as e:
+            print(f"Error during training: {e}")
+            # Reconnect on the next job in case the connection went stale
+            sensor_data_sheet = None
+            send_status(job_id, 'failed', str(e))
+        finally:
+            cancelled.discard(job_id)
+
+    cache.close()
+
+
+class TrainingWorker:
+    """Parent-side handle that starts the worker process and runs jobs on it"""
+
+    def __init__(self, cwd=None, python=sys.executable):
+        self.command = [python, '-u', os.path.abspath(__file__)]
+        self.cwd = cwd
+        self.process = None
+        self.statuses = queue.Queue()
+        self.on_line = None
+        self.lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the worker process if it isn't running; it warms up in the background"""
+        with self.lock:
+            if self.alive:
+                return
+            self.statuses = queue.Queue()
+            self.process = subprocess.Popen(self.command, cwd=self.cwd, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            text=True, bufsize=1)
+            threading.Thread(target=self._read_output, args=(self.process, self.statuses),
+                             name='training-worker-output', daemon=True).start()
+
+    def _read_output(self, process, statuses):
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            if line.startswith(STATUS_PREFIX):
+                statuses.put(json.loads(line[len(STATUS_PREFIX):]))
+            elif self.on_line is not None:
+                self.on_line(line)
+            else:
+                print(f"[training worker] {line}")
+
+    def _send(self, command):
+        self.process.stdin.write(json.dumps(command) + '\n')
+        self.process.stdin.flush()
+
+    def stop(self):
+        with self.lock:
+            if self.alive:
+                self.process.kill()
+                self.process.wait()
+
+    def run(self, job_id, on_line, cancel_requested, timeout=None):
+        """Train one cycle on the worker; returns (state, message) with state done, failed or cancelled.
+
+        on_line receives the job's output lines. Setting cancel_requested (a threading.Event)
+        or exceeding timeout stops the job after its current episode, or kills the worker if
+        it doesn't stop within CANCEL_GRACE_S.
+        """
+        self.start()
+        statuses = self.statuses
+        self.on_line = on_line
+        deadline = time.monotonic() + timeout if timeout else None
+        stop_by = None
+        timed_out = False
+        try:
+            self._send({'job': job_id})
+            while True:
+                try:
+                    status = statuses.get(timeout=POLL_INTERVAL_S)
+                except queue.Empty:
+                    status = None
+
+                if status is not None and status['job'] == job_id:
+                    if timed_out:
+                        return 'failed', f"Training timed out after {timeout} seconds"
+                    return status['state'], status.get('message')
+                if status is None and not self.alive:
+                    return 'failed', 'Training worker exited unexpectedly'
+
+                now = time.monotonic()
+                if stop_by is None and (cancel_requested.is_set() or (deadline and now > deadline)):
+                    timed_out = not cancel_requested.is_set()
+                    self._send({'cancel': job_id})
+                    stop_by = now + CANCEL_GRACE_S
+                elif stop_by is not None and now > stop_by:
+                    # Stuck outside the episode loop (e.g. in a Sheets call); the next job starts a fresh worker
+                    self.stop()
+                    if timed_out:
+                        return 'failed', f"Training timed out after {timeout} seconds"
+                    return 'cancelled', 'Training worker was restarted to cancel the job'
+        except OSError as e:
+            return 'failed', f"Could not reach the training worker: {e}"
+        finally:
+            self.on_line = None
+
+
+if __name__ == "__main__":
+    serve()
@@ -2,20 +2,29 @@ import os
 import json
 import time
 import csv
-import requests
 import pandas as pd
-import subprocess
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import sys
 from flask import Flask, render_template, request, jsonify, send_file, Response
 from datetime import datetime
-import io
-import re
 import base64
-import glob
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+
+# The training and inference modules live in Deep_Q_Reinforcement
+DQN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Deep_Q_Reinforcement')
+if DQN_DIR not in sys.path:
+    sys.path.append(DQN_DIR)
+
+from model_server import ModelServer, parse_readings
+from model_registry import ModelRegistry
+from training_jobs import TrainingJobQueue
+from plot_cache import PlotCache
+from metrics_index import MetricsIndex
+from sheets_client import SheetsClient
+from http_client import get_client, upstream_stats
+from recommendation_cache import RecommendationCache, fingerprint
+from concurrent.futures import ThreadPoolExecutor
+from metrics_series import (metrics_series, latest_metrics, version, SERIES_METRICS, DOWNSAMPLE_METHODS,
+                            DEFAULT_POINTS, MIN_POINTS, MAX_POINTS)
+from training_worker import TrainingWorker
 
 
 app = Flask(__name__)
@@ -32,43 +41,65 @@ METRICS_FOLDER = "<YOUR_METRICS_FOLDER_PATH>"
 TRAINING_SCRIPT_PATH = "<YOUR_TRAINING_SCRIPT_PATH>"
 GOOGLE_SHEET_URL = "<YOUR_GOOGLE_SHEET_URL>"
 CREDENTIALS_PATH = "<YOUR_CREDENTIALS_FILE_PATH>"
+MODELS_FOLDER = "<YOUR_MODELS_FOLDER_PATH>"
+THINGSPEAK_BASE_URL = "https://api.thingspeak.com"
+PINATA_BASE_URL = "https://api.pinata.cloud"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+EMAIL_HISTORY_LIMIT = 100  # Most recent EmailLog rows returned by default, and the most that can be requested
+# 'worker' trains on a long-lived process that keeps torch, Sheets and the sensor cache
+# loaded between runs; 'subprocess' runs TRAINING_SCRIPT_PATH --once for every job
+TRAINING_BACKEND = 'worker'
+
+# Trained cycles (with an LRU cache of loaded models) and the /predict server on top of it
+model_registry = ModelRegistry([MODELS_FOLDER], METRICS_FOLDER)
+model_server = ModelServer(model_registry)
+
+def training_job_result():
+    latest_metrics_file = get_latest_metrics_file()
+    return {'metrics_file': latest_metrics_file} if latest_metrics_file else None
+
+# One training run at a time, in the background
+if TRAINING_BACKEND == 'worker':
+    training_worker = TrainingWorker()
+    training_jobs = TrainingJobQueue(worker=training_worker, on_success=training_job_result)
+else:
+    training_worker = None
+    training_jobs = TrainingJobQueue([sys.executable, '-u', TRAINING_SCRIPT_PATH, '--once'],
+                                     on_success=training_job_result)
+
+# Pooled clients for upstream services, with per-service timeouts (connect, read)
+thingspeak_client = get_client('thingspeak', base_url=THINGSPEAK_BASE_URL, timeout=(3.05, 10))
+pinata_client = get_client('pinata', base_url=PINATA_BASE_URL, timeout=(3.05, 60))
+gemini_client = get_client('gemini', base_url=GEMINI_BASE_URL, timeout=(3.05, 30))
+apps_script_client = get_client('apps_script', timeout=(3.05, 30))
+
+# Gemini answers keyed on the prompt inputs and language
+recommendation_cache = RecommendationCache()
+
+# Process-wide Sheets client; reads are tail-limited and cached briefly
+sheets = SheetsClient(CREDENTIALS_PATH, GOOGLE_SHEET_URL)
+
+# Rendered metrics plots, keyed by file version
+plot_cache = PlotCache()
+
+# Cycle -> metrics file index, rescanned only when the folder changes
+metrics_index = MetricsIndex(METRICS_FOLDER)
 
 # Function to get the latest metrics file
 def get_latest_metrics_file():
-    # Match files with pattern 'training_metrics_<number>.csv'
-    pattern = os.path.join(METRICS_FOLDER, "training_metrics_*.csv")
-    files = glob.glob(pattern)
-    
-    if not files:
+    entry = metrics_index.latest()
+    return entry['path'] if entry else None
+
+def get_metrics_file_for_cycle(cycle):
+    try:
+        return metrics_index.path(int(cycle))
+    except ValueError:
         return None
-    
-    # Extract numeric portion from filenames and sort numerically
-    def extract_number(file_path):
-        filename = os.path.basename(file_path)
-        match = re.search(r'training_metrics_(\d+)\.csv$', filename)
-        return int(match.group(1)) if match else -1
-    
-    # Sort files by their numeric identifier in descending order
-    files.sort(key=extract_number, reverse=True)
-    
-    return files[0] if files else None
 
-def get_sheet_data():
-    """Get data from Google Sheets"""
+def get_sheet_data(limit=None):
+    """Get data from Google Sheets (only the last `limit` rows when given)"""
     try:
-        # Set up credentials
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_PATH, scope)
-        client = gspread.authorize(credentials)
-        
-        # Open the spreadsheet and get the SensorData sheet
-        spreadsheet = client.open_by_url(GOOGLE_SHEET_URL)
-        sensor_sheet = spreadsheet.worksheet("SensorData")
-        
-        # Get all data
-        sensor_data = sensor_sheet.get_all_records()
-        
-        return sensor_data
+        return sheets.records("SensorData", limit)
     except Exception as e:
         print(f"Error accessing Google Sheets: {str(e)}")
         return None
@@ -88,37 +119,51 @@ def index():
 @app.route('/run_training', methods=['POST'])
 def run_training():
     try:
-        # Add a simple response first to test if the route works at all
         app.logger.info("Run training endpoint called")
-        
-        # Use a timeout to prevent hanging
-        # Run the Python training script with a timeout
-        try:
-            result = subprocess.run([
-                'python', 
-                TRAINING_SCRIPT_PATH
-            ], capture_output=True, text=True, timeout=300)  # 5-minute timeout
-            
-            if result.returncode != 0:
-                error_message = result.stderr if result.stderr else "Unknown error occurred during training"
-                app.logger.error(f"Training script failed: {error_message}")
-                return jsonify({'status': 'error', 'message': error_message})
-            
-        except subprocess.TimeoutExpired:
-            app.logger.error("Training script timed out after 5 minutes")
-            return jsonify({'status': 'error', 'message': 'Training script timed out after 5 minutes'})
-        
-        # Check for the latest metrics file
-        latest_metrics_file = get_latest_metrics_file()
-        if latest_metrics_file:
-            return jsonify({'status': 'success', 'message': 'Training completed successfully', 'metrics_file': latest_metrics_file})
-        else:
-            return jsonify({'status': 'error', 'message': 'Training metrics file not found'})
-            
+
+        # Training runs in the background; clients poll /training_jobs/<id> for the outcome
+        job, created = training_jobs.submit()
+        message = 'Training started' if created else 'Training is already in progress'
+        return jsonify({'status': 'success', 'message': message, 'job': job.to_dict()}), 202
+
     except Exception as e:
         app.logger.exception(f"Exception in run_training route: {str(e)}")
         return jsonify({'status': 'error', 'message': f"Server error: {str(e)}"}), 500
 
+@app.route('/training_jobs')
+def list_training_jobs():
+    return jsonify({'status': 'success', 'jobs': [job.to_dict() for job in training_jobs.list()]})
+
+@app.route('/training_jobs/<job_id>')
+def get_training_job(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'Training job {job_id} not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
+@app.route('/training_jobs/<job_id>/stream')
+def stream_training_job(job_id):
+    """Per-episode progress of a training job as Server-Sent Events"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'Training job {job_id} not found'}), 404
+
+    # Reconnecting EventSource clients resume after the last event they saw
+    try:
+        after = int(request.headers.get('Last-Event-ID', request.args.get('after', 0)))
+    except ValueError:
+        after = 0
+
+    return Response(training_jobs.stream(job, after), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/training_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_training_job(job_id):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'Training job {job_id} not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
 @app.route('/get_training_metrics')
 def get_training_metrics():
     latest_metrics_file = get_latest_metrics_file()
@@ -126,46 +171,12 @@ def get_training_metrics():
         return jsonify({'status': 'error', 'message': 'No training metrics file found'})
     
     try:
-        df = pd.read_csv(latest_metrics_file)
-        
-        # Create a plot
-        plt.figure(figsize=(10, 6))
-        
-        # Plot accuracy
-        plt.subplot(1, 2, 1)
-        plt.plot(df['epoch'], df['accuracy'], 'g-', label='Accuracy')
-        if 'val_accuracy' in df.columns:
-            plt.plot(df['epoch'], df['val_accuracy'], 'g--', label='Validation Accuracy')
-        plt.title('Model Accuracy')
-        plt.xlabel('Epoch')
-        plt.ylabel('Accuracy')
-        plt.legend()
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        # Plot loss
-        plt.subplot(1, 2, 2)
-        plt.plot(df['epoch'], df['loss'], 'g-', label='Loss')
-        if 'val_loss' in df.columns:
-            plt.plot(df['epoch'], df['val_loss'], 'g--', label='Validation Loss')
-        plt.title('Model Loss')
-        plt.xlabel('Epoch')
-        plt.ylabel('Loss')
-        plt.legend()
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        
-        # Convert plot to base64 for embedding in HTML
-        plot_data = base64.b64encode(buf.read()).decode('utf-8')
+        # Clients that load plot_url skip the render entirely with ?plot=0
+        render = request.args.get('plot') != '0'
+        plot = plot_cache.get(latest_metrics_file) if render else None
         
         # Get the latest metrics - ensure numeric conversion
-        latest = df.iloc[-1].to_dict()
+        latest = dict(plot.latest) if render else latest_metrics(latest_metrics_file)
 
         # Convert all numeric values to appropriate types
         numeric_fields = ['epoch', 'loss', 'accuracy', 'val_loss', 'val_accuracy']
@@ -179,13 +190,90 @@ def get_training_metrics():
         # Add cycle number
         cycle_num = os.path.basename(latest_metrics_file).split('_')[-1].split('.')[0]
         
-        return jsonify({
+        response = {
             'status': 'success', 
-            'plot': plot_data,
+            'plot_url': f'/metrics_plot/latest.png?v={version(latest_metrics_file)}',
             'latest_metrics': latest,
             'cycle': cycle_num,
             'metrics_file': latest_metrics_file
-        })
+        }
+        if render:
+            response['plot'] = base64.b64encode(plot.png).decode('utf-8')
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+def send_plot(plot):
+    """Serve a rendered plot as PNG, answering 304 when the client's copy is current"""
+    response = Response(plot.png, mimetype='image/png')
+    response.set_etag(plot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/metrics_plot/latest.png')
+def get_latest_metrics_plot():
+    latest_metrics_file = get_latest_metrics_file()
+    if not latest_metrics_file:
+        return jsonify({'status': 'error', 'message': 'No training metrics file found'}), 404
+    return send_plot(plot_cache.get(latest_metrics_file))
+
+@app.route('/metrics_plot/<int:cycle>.png')
+def get_metrics_plot(cycle):
+    metrics_file = get_metrics_file_for_cycle(cycle)
+    if not metrics_file:
+        return jsonify({'status': 'error', 'message': f'Metrics for cycle {cycle} not found'}), 404
+    return send_plot(plot_cache.get(metrics_file, f' - Cycle {cycle}'))
+
+@app.route('/metrics_series')
+def get_metrics_series():
+    """Downsampled metric curves as JSON, for one or more cycles (default: the latest)"""
+    try:
+        points = int(request.args.get('points', DEFAULT_POINTS))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'points must be an integer'}), 400
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        return jsonify({'status': 'error', 'message': f'points must be between {MIN_POINTS} and {MAX_POINTS}'}), 400
+
+    method = request.args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'status': 'error', 'message': f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}"}), 400
+
+    metrics = request.args.get('metrics')
+    metrics = metrics.split(',') if metrics else SERIES_METRICS
+    unknown = [metric for metric in metrics if metric not in SERIES_METRICS]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Unknown metrics: {', '.join(unknown)}"}), 400
+
+    # Resolve the requested cycles to metrics files
+    files = []
+    missing = []
+    cycles = request.args.get('cycles')
+    if cycles:
+        try:
+            cycles = [int(cycle) for cycle in cycles.split(',')]
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'cycles must be a comma-separated list of integers'}), 400
+        for cycle in cycles:
+            metrics_file = get_metrics_file_for_cycle(cycle)
+            if metrics_file:
+                files.append((cycle, metrics_file))
+            else:
+                missing.append(cycle)
+    else:
+        latest_metrics_file = get_latest_metrics_file()
+        if latest_metrics_file:
+            cycle_num = os.path.basename(latest_metrics_file).split('_')[-1].split('.')[0]
+            files.append((int(cycle_num), latest_metrics_file))
+
+    if not files:
+        return jsonify({'status': 'error', 'message': 'No training metrics file found', 'missing': missing}), 404
+
+    try:
+        series = []
+        for cycle, metrics_file in files:
+            series.append({'cycle': cycle, **metrics_series(metrics_file, points, method, metrics)})
+        return jsonify({'status': 'success', 'method': method, 'max_points': points,
+                        'series': series, 'missing': missing})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
@@ -204,8 +292,6 @@ def upload_to_ipfs():
         return jsonify({'status': 'error', 'message': 'No training metrics file found'})
     
     try:
-        url = "https://api.pinata.cloud/pinning/pinFileToIPFS"
-        
         # Extract cycle number from filename for metadata
         cycle_num = os.path.basename(latest_metrics_file).split('_')[-1].split('.')[0]
         
@@ -213,16 +299,16 @@ def upload_to_ipfs():
             'name': f'trainmetrics_cycle{cycle_num}_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         })}
         
-        files = [
-            ('file', (os.path.basename(latest_metrics_file), open(latest_metrics_file, 'rb'), 'text/csv'))
-        ]
-        
         headers = {
             'pinata_api_key': PINATA_API_KEY,
             'pinata_secret_api_key': PINATA_SECRET_KEY
         }
         
-        response = requests.post(url, headers=headers, data=payload, files=files)
+        with open(latest_metrics_file, 'rb') as metrics_file:
+            files = [
+                ('file', (os.path.basename(latest_metrics_file), metrics_file, 'text/csv'))
+            ]
+            response = pinata_client.post('/pinning/pinFileToIPFS', headers=headers, data=payload, files=files)
         
         if response.status_code == 200:
             ipfs_hash = response.json().get('IpfsHash')
@@ -243,8 +329,8 @@ def upload_to_ipfs():
 @app.route('/get_thingspeak_data')
 def get_thingspeak_data():
     try:
-        url = f"https://api.thingspeak.com/channels/{THINGSPEAK_CHANNEL}/feeds.json?api_key={THINGSPEAK_API_KEY}&results=50"
-        response = requests.get(url)
+        response = thingspeak_client.get(f"/channels/{THINGSPEAK_CHANNEL}/feeds.json",
+                                         params={'api_key': THINGSPEAK_API_KEY, 'results': 50})
         
         if response.status_code == 200:
             data = response.json()
@@ -260,69 +346,130 @@ def get_thingspeak_data():
             })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
+
+# Instruction appended to the prompt for each supported language
+LANGUAGE_INSTRUCTIONS = {
+    'english': "",
+    'tamil': "Please respond in Tamil language.",
+    'telugu': "Please respond in Telugu language.",
+    'kannada': "Please respond in Kannada language.",
+    'malayalam': "Please respond in Malayalam language."
+}
+
+def recommendation_inputs():
+    """The 5 most recent sensor rows and a summary of the latest training metrics"""
+    # Only the 5 most recent rows are read from the sheet
+    recent_data = get_sheet_data(limit=5)
+    if not recent_data:
+        return None, None
+    
+    # Extract training metrics if available
+    training_metrics = "No training metrics available."
+    latest_metrics_file = get_latest_metrics_file()
+    if latest_metrics_file:
+        df = pd.read_csv(latest_metrics_file)
+        latest_metrics = df.iloc[-1].to_dict()
+        cycle_num = os.path.basename(latest_metrics_file).split('_')[-1].split('.')[0]
+        training_metrics = f"Latest training metrics (cycle {cycle_num}): {json.dumps(latest_metrics)}"
+    
+    return recent_data, training_metrics
+
+def recommendation_prompt(recent_data, training_metrics, instruction):
+    return f"""Based on the following data, provide a brief recommendation for system optimization and food status assessment (max 3 sentences):
+                    
+Sensor Data (most recent): {json.dumps(recent_data)}
+
+{training_metrics}
+
+Keep your recommendation concise, practical and focused on improving system performance and food condition assessment. {instruction}"""
+
+def call_gemini(text, json_output=False):
+    """Generate text with Gemini; raises RuntimeError on an API error"""
+    prompt = {"contents": [{"parts": [{"text": text}]}]}
+    if json_output:
+        prompt["generationConfig"] = {"responseMimeType": "application/json"}
+    
+    # Generating a recommendation has no side effects, so the POST may be retried
+    gemini_response = gemini_client.post("/v1beta/models/gemini-2.0-flash:generateContent",
+                                         params={'key': GEMINI_API_KEY}, json=prompt, retry=True)
+    
+    if gemini_response.status_code != 200:
+        raise RuntimeError(f'Gemini API error: {gemini_response.text}')
+    
+    return gemini_response.json().get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', "No recommendation available.")
+
+def recommend_all_languages(inputs_key, recent_data, training_metrics):
+    """Recommendations in every supported language, using one batched Gemini call for the missing ones"""
+    recommendations = {language: recommendation_cache.get((inputs_key, language)) for language in LANGUAGE_INSTRUCTIONS}
+    missing = [language for language, text in recommendations.items() if text is None]
+    if not missing:
+        return recommendations
+    
+    base_prompt = recommendation_prompt(recent_data, training_metrics, "")
+    try:
+        answer = json.loads(call_gemini(
+            f"""{base_prompt}
+
+Write this recommendation separately in each of these languages: {', '.join(missing)}.
+Respond with a JSON object whose keys are exactly these language names (lowercase) and whose values are the recommendation text in that language.""",
+            json_output=True))
+        batched = {language: answer[language] for language in missing if isinstance(answer.get(language), str)}
+    except (ValueError, AttributeError) as e:
+        # The model didn't return the requested JSON; ask per language instead
+        print(f"Batched Gemini recommendation could not be parsed: {e}")
+        batched = {}
+    
+    # Anything the batch didn't cover is requested concurrently, one language per call
+    remaining = [language for language in missing if language not in batched]
+    if remaining:
+        with ThreadPoolExecutor(max_workers=len(remaining)) as executor:
+            texts = executor.map(
+                lambda language: call_gemini(recommendation_prompt(recent_data, training_metrics, LANGUAGE_INSTRUCTIONS[language])),
+                remaining)
+            batched.update(zip(remaining, texts))
+    
+    for language, text in batched.items():
+        recommendation_cache.put((inputs_key, language), text)
+        recommendations[language] = text
+    return recommendations
+
 @app.route('/get_gemini_recommendation', methods=['GET'])
 def get_gemini_recommendation():
     try:
-        # Get language parameter (default to English)
+        # Get language parameter (default to English); 'all' returns every supported language
         language = request.args.get('language', 'english')
         
         # Get Google Sheets data
-        sensor_data = get_sheet_data()
-        
-        if not sensor_data:
+        recent_data, training_metrics = recommendation_inputs()
+        if not recent_data:
             return jsonify({'status': 'error', 'message': 'Failed to fetch Google Sheets data'})
         
-        # Get only the 5 most recent entries
-        recent_data = sensor_data[-5:] if len(sensor_data) >= 5 else sensor_data
-        
-        # Extract training metrics if available
-        training_metrics = "No training metrics available."
-        latest_metrics_file = get_latest_metrics_file()
-        if latest_metrics_file:
-            df = pd.read_csv(latest_metrics_file)
-            latest_metrics = df.iloc[-1].to_dict()
-            cycle_num = os.path.basename(latest_metrics_file).split('_')[-1].split('.')[0]
-            training_metrics = f"Latest training metrics (cycle {cycle_num}): {json.dumps(latest_metrics)}"
-        
-        # Set the language instruction based on the selected language
-        language_instruction = ""
-        if language == "tamil":
-            language_instruction = "Please respond in Tamil language."
-        elif language == "telugu":
-            language_instruction = "Please respond in Telugu language."
-        elif language == "kannada":
-            language_instruction = "Please respond in Kannada language."
-        elif language == "malayalam":
-            language_instruction = "Please respond in Malayalam language."
-        
-        # Prepare the prompt for Gemini
-        prompt = {
-            "contents": [{
-                "parts": [{
-                    "text": f"""Based on the following data, provide a brief recommendation for system optimization and food status assessment (max 3 sentences):
-                    
-Sensor Data (most recent): {json.dumps(recent_data)}
-
-{training_metrics}
-
-Keep your recommendation concise, practical and focused on improving system performance and food condition assessment. {language_instruction}"""
-                }]
-            }]
-        }
-        
-        # Call Gemini API
-        gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-        gemini_response = requests.post(gemini_url, json=prompt)
+        # Unchanged inputs reuse the cached answer; concurrent identical requests share one call
+        inputs_key = fingerprint(recent_data, training_metrics)
         
-        if gemini_response.status_code != 200:
-            return jsonify({'status': 'error', 'message': f'Gemini API error: {gemini_response.text}'})
+        if language == 'all':
+            recommendations, cached = recommendation_cache.get_or_compute(
+                (inputs_key, 'all'), lambda: recommend_all_languages(inputs_key, recent_data, training_metrics))
+            return jsonify({
+                'status': 'success',
+                'recommendation': recommendations['english'],
+                'recommendations': recommendations,
+                'language': language,
+                'cached': cached
+            })
         
-        recommendation = gemini_response.json().get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', "No recommendation available.")
+        # Unsupported languages fall back to English, as before
+        instruction = LANGUAGE_INSTRUCTIONS.get(language, "")
+        cache_language = language if language in LANGUAGE_INSTRUCTIONS else 'english'
+        recommendation, cached = recommendation_cache.get_or_compute(
+            (inputs_key, cache_language),
+            lambda: call_gemini(recommendation_prompt(recent_data, training_metrics, instruction)))
         
         return jsonify({
             'status': 'success',
             'recommendation': recommendation,
-            'language': language
+            'language': language,
+            'cached': cached
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -352,7 +499,8 @@ def send_email():
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        response = requests.post(GSCRIPT_EMAIL_ENDPOINT, json=payload)
+        # Not retried: a repeated call could send the email twice
+        response = apps_script_client.post(GSCRIPT_EMAIL_ENDPOINT, json=payload)
         
         if response.status_code == 200:
             return jsonify({'status': 'success', 'message': 'Email sent successfully'})
@@ -364,17 +512,15 @@ def send_email():
 @app.route('/get_email_history')
 def get_email_history():
     try:
-        # Set up credentials
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_PATH, scope)
-        client = gspread.authorize(credentials)
-        
-        # Open the spreadsheet and get the EmailLog sheet
-        spreadsheet = client.open_by_url(GOOGLE_SHEET_URL)
-        email_sheet = spreadsheet.worksheet("EmailLog")
+        try:
+            limit = int(request.args.get('limit', EMAIL_HISTORY_LIMIT))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
         
-        # Get all data from the EmailLog sheet
-        email_data = email_sheet.get_all_records()
+        # Only the most recent rows of the EmailLog sheet. Every request reads the same
+        # tail and slices it, so the Sheets client caches one entry however limit varies
+        limit = min(max(limit, 1), EMAIL_HISTORY_LIMIT)
+        email_data = sheets.records("EmailLog", EMAIL_HISTORY_LIMIT)[-limit:]
         
         # Transform data to match expected frontend structure
         history = []
@@ -398,22 +544,13 @@ def get_email_history():
 @app.route('/list_all_metrics')
 def list_all_metrics():
     try:
-        pattern = os.path.join(METRICS_FOLDER, "metricstraining_metrics_*.csv")
-        files = glob.glob(pattern)
-        
-        metrics_files = []
-        for file in files:
-            cycle_num = os.path.basename(file).split('_')[-1].split('.')[0]
-            create_time = datetime.fromtimestamp(os.path.getctime(file)).strftime('%Y-%m-%d %H:%M:%S')
-            metrics_files.append({
-                'file': os.path.basename(file),
-                'cycle': cycle_num,
-                'created': create_time,
-                'path': file
-            })
-        
-        # Sort by cycle number (newest first)
-        metrics_files.sort(key=lambda x: int(x['cycle']), reverse=True)
+        # Already sorted by cycle number (newest first)
+        metrics_files = [{
+            'file': entry['file'],
+            'cycle': str(entry['cycle']),
+            'created': entry['created'],
+            'path': entry['path']
+        } for entry in metrics_index.list()]
         
         return jsonify({
             'status': 'success',
@@ -425,61 +562,69 @@ def list_all_metrics():
 @app.route('/get_metrics_by_cycle/<cycle>')
 def get_metrics_by_cycle(cycle):
     try:
-        metrics_file = os.path.join(METRICS_FOLDER, f"metricstraining_metrics_{cycle}.csv")
+        metrics_file = get_metrics_file_for_cycle(cycle)
         
-        if not os.path.exists(metrics_file):
+        if not metrics_file:
             return jsonify({'status': 'error', 'message': f'Metrics for cycle {cycle} not found'})
         
-        df = pd.read_csv(metrics_file)
-        
-        # Create a plot
-        plt.figure(figsize=(10, 6))
-        
-        # Plot accuracy
-        plt.subplot(1, 2, 1)
-        plt.plot(df['epoch'], df['accuracy'], 'g-', label='Accuracy')
-        if 'val_accuracy' in df.columns:
-            plt.plot(df['epoch'], df['val_accuracy'], 'g--', label='Validation Accuracy')
-        plt.title(f'Model Accuracy - Cycle {cycle}')
-        plt.xlabel('Epoch')
-        plt.ylabel('Accuracy')
-        plt.legend()
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        # Plot loss
-        plt.subplot(1, 2, 2)
-        plt.plot(df['epoch'], df['loss'], 'g-', label='Loss')
-        if 'val_loss' in df.columns:
-            plt.plot(df['epoch'], df['val_loss'], 'g--', label='Validation Loss')
-        plt.title(f'Model Loss - Cycle {cycle}')
-        plt.xlabel('Epoch')
-        plt.ylabel('Loss')
-        plt.legend()
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        
-        # Convert plot to base64 for embedding in HTML
-        plot_data = base64.b64encode(buf.read()).decode('utf-8')
+        # The plot is only rendered for clients that want it inline
+        render = request.args.get('plot') != '0'
+        plot = plot_cache.get(metrics_file, f' - Cycle {cycle}') if render else None
         
-        # Get the latest metrics
-        latest = df.iloc[-1].to_dict()
-        
-        return jsonify({
+        response = {
             'status': 'success', 
-            'plot': plot_data,
-            'latest_metrics': latest,
+            'plot_url': f'/metrics_plot/{cycle}.png?v={version(metrics_file)}',
+            'latest_metrics': plot.latest if render else latest_metrics(metrics_file),
             'cycle': cycle,
             'metrics_file': metrics_file
+        }
+        if render:
+            response['plot'] = base64.b64encode(plot.png).decode('utf-8')
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/upstream_stats')
+def get_upstream_stats():
+    """Call counts, errors, retries, circuit state and latency per upstream service"""
+    return jsonify({'status': 'success', 'upstreams': upstream_stats()})
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """Decide Keep / Market / NGO for one reading or a batch of readings"""
+    try:
+        features, timestamps, is_batch = parse_readings(request.get_json(silent=True))
+        cycle = request.args.get('cycle', type=int)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        predictions, cycle = model_server.decide(features, cycle, timestamps)
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        app.logger.exception(f"Prediction failed: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+    if is_batch:
+        return jsonify({'status': 'success', 'cycle': cycle, 'predictions': predictions})
+    return jsonify({'status': 'success', 'cycle': cycle, **predictions[0]})
+
+@app.route('/models')
+def list_models():
+    try:
+        return jsonify({
+            'status': 'success',
+            'current_cycle': model_registry.current_cycle,
+            'cycles': model_registry.cycles()
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
 if __name__ == '__main__':
+    # Warm the training worker up front, in the reloader's serving process only
+    if training_worker is not None and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        training_worker.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
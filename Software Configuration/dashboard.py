@@ -1,10 +1,13 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, request, redirect, url_for
 import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-import requests
 import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_client
 
 app = Flask(__name__)
 
@@ -18,57 +21,168 @@ THEME = {
 # URL of the web app publishing your Google Sheets
 SCRIPT_URL = "script_url"
 
+# Pooled, retried GETs with a timeout, so a slow Apps Script can't hang the page
+script_client = get_client('apps_script', timeout=(3.05, 15))
+
+# Sheets fetched for the page and the number of trailing rows kept from each (None keeps all)
+SOURCES = {
+    'SensorData': 10,
+    'EmailLog': 5,
+    'training_metrics': None,
+    'trainingmetrics1': None
+}
+
+# Columns a sheet must have to be used; anything else (such as an Apps Script error page) counts as missing
+REQUIRED_COLUMNS = {
+    'SensorData': ['Timestamp', 'Status'],
+    'EmailLog': ['Timestamp'],
+    'training_metrics': ['epoch', 'loss', 'accuracy'],
+    'trainingmetrics1': ['epoch', 'loss', 'accuracy']
+}
+
+# Seconds the page waits for each sheet; a slower sheet is left out of this render
+SOURCE_DEADLINE_S = 8
+
+# Shared, so a sheet that misses its deadline finishes in the background instead of holding up the page
+fetch_pool = ThreadPoolExecutor(max_workers=len(SOURCES) * 2)
+
+def read_csv_tail(text, rows):
+    """Parse the header and only the last `rows` lines of a CSV export"""
+    if rows is None:
+        return pd.read_csv(io.StringIO(text))
+    header, _, body = text.strip('\n').partition('\n')
+    tail = body.rsplit('\n', rows)[-rows:] if body else []
+    return pd.read_csv(io.StringIO('\n'.join([header] + tail)))
+
+def fetch_sheet(sheet, rows):
+    response = script_client.get(SCRIPT_URL, params={'sheet': sheet}, timeout=(3.05, SOURCE_DEADLINE_S))
+    response.raise_for_status()
+    frame = read_csv_tail(response.text, rows)
+    missing_columns = [column for column in REQUIRED_COLUMNS.get(sheet, []) if column not in frame.columns]
+    if missing_columns:
+        raise ValueError(f"response has no {', '.join(missing_columns)} column")
+    return frame
+
 def get_data():
-    """Get data from Google Sheets using the web app URL"""
-    try:
-        # Fetch data from SensorData sheet
-        sensor_response = requests.get(f"{SCRIPT_URL}?sheet=SensorData")
-        sensor_data = pd.read_csv(io.StringIO(sensor_response.text))
-        
-        # Fetch data from EmailLog sheet
-        email_response = requests.get(f"{SCRIPT_URL}?sheet=EmailLog")
-        email_log = pd.read_csv(io.StringIO(email_response.text))
-        
-        # Try to fetch training metrics if available
-        try:
-            metrics_response = requests.get(f"{SCRIPT_URL}?sheet=training_metrics")
-            metrics = pd.read_csv(io.StringIO(metrics_response.text))
-        except Exception:
-            # If the file doesn't exist yet or there's an error
-            metrics = pd.DataFrame()
-        
-        # Check if there's a second training metrics file
+    """Get data from Google Sheets using the web app URL; all sheets are fetched concurrently"""
+    started = time.monotonic()
+    futures = {sheet: fetch_pool.submit(fetch_sheet, sheet, rows) for sheet, rows in SOURCES.items()}
+    
+    frames = {}
+    missing = []
+    for sheet, future in futures.items():
         try:
-            metrics1_response = requests.get(f"{SCRIPT_URL}?sheet=trainingmetrics1")
-            metrics1 = pd.read_csv(io.StringIO(metrics1_response.text))
-            # If it exists, concatenate with the first metrics dataframe
-            if not metrics.empty:
-                metrics = pd.concat([metrics, metrics1])
-        except Exception:
-            # If the second file doesn't exist yet
-            pass
-            
-        return {
-            'sensor_data': sensor_data.tail(10).to_dict('records') if not sensor_data.empty else [],
-            'email_log': email_log.tail(5).to_dict('records') if not email_log.empty else [],
-            'metrics': metrics.to_dict('records') if not metrics.empty else [],
-            'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'csv_status': sensor_data.iloc[-1]['Status'] if not sensor_data.empty else "No data"
-        }
-    except Exception as e:
-        print(f"Error fetching data: {e}")
-        return {
-            'sensor_data': [],
-            'email_log': [],
-            'metrics': [],
-            'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'csv_status': "Error"
-        }
+            frames[sheet] = future.result(timeout=max(0, started + SOURCE_DEADLINE_S - time.monotonic()))
+        except Exception as e:
+            # Slow or failed sheet; render what arrived
+            if sheet not in ('training_metrics', 'trainingmetrics1'):
+                print(f"Error fetching {sheet}: {e!r}")
+            missing.append(sheet)
+    
+    sensor_data = frames.get('SensorData', pd.DataFrame())
+    email_log = frames.get('EmailLog', pd.DataFrame())
+    # The metrics sheets may not exist yet; the second one is only added to the first
+    metrics = frames.get('training_metrics', pd.DataFrame())
+    if not metrics.empty and 'trainingmetrics1' in frames:
+        metrics = pd.concat([metrics, frames['trainingmetrics1']])
+    
+    if 'SensorData' in missing:
+        csv_status = "Error"
+    else:
+        csv_status = sensor_data.iloc[-1].get('Status', "No data") if not sensor_data.empty else "No data"
+    
+    return {
+        'sensor_data': sensor_data.to_dict('records') if not sensor_data.empty else [],
+        'email_log': email_log.to_dict('records') if not email_log.empty else [],
+        'metrics': metrics.to_dict('records') if not metrics.empty else [],
+        'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'csv_status': csv_status,
+        'missing_sources': missing
+    }
+
+# Seconds between background refreshes of the dashboard snapshot
+REFRESH_INTERVAL_S = 30
+# A refresh requested from the page is skipped if the snapshot is younger than this
+MIN_REFRESH_INTERVAL_S = 5
+
+class DashboardSnapshot:
+    """Dashboard data kept in memory and refreshed by a background thread.
+    
+    Page loads are served from the snapshot, so upstream traffic doesn't grow with the number of viewers.
+    """
+    
+    def __init__(self, interval=REFRESH_INTERVAL_S):
+        self.interval = interval
+        self.data = None
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.thread = None
+    
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+    
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.interval)
+    
+    def age(self):
+        return time.monotonic() - self.refreshed_at if self.refreshed_at is not None else None
+    
+    def refresh(self, min_age=0):
+        """Fetch new data unless the snapshot is younger than min_age; concurrent callers share one fetch"""
+        with self.refresh_lock:
+            age = self.age()
+            if age is not None and age < min_age:
+                return
+            try:
+                data = get_data()
+            except Exception as e:
+                # Still store a snapshot, so viewers are served from it instead of each refetching
+                print(f"Error refreshing dashboard: {e}")
+                data = {
+                    'sensor_data': [],
+                    'email_log': [],
+                    'metrics': [],
+                    'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'csv_status': "Error",
+                    'missing_sources': list(SOURCES)
+                }
+            with self.lock:
+                previous = self.data
+                # Keep the last good copy of a section whose sheet didn't arrive this time
+                if previous:
+                    if 'SensorData' in data['missing_sources']:
+                        data['sensor_data'] = previous['sensor_data']
+                        data['csv_status'] = previous['csv_status']
+                    if 'EmailLog' in data['missing_sources']:
+                        data['email_log'] = previous['email_log']
+                self.data = data
+                self.refreshed_at = time.monotonic()
+    
+    def get(self):
+        """The current snapshot; the first call waits for the initial fetch"""
+        self.start()
+        if self.data is None:
+            self.refresh(min_age=self.interval)
+        with self.lock:
+            return dict(self.data, age_s=int(self.age()))
+
+snapshot = DashboardSnapshot()
 
 @app.route('/')
 def dashboard():
-    data = get_data()
+    # ?refresh=1 fetches now, then redirects so reloading the page doesn't fetch again
+    if request.args.get('refresh') == '1':
+        snapshot.refresh(min_age=MIN_REFRESH_INTERVAL_S)
+        return redirect(url_for('dashboard'))
+    
+    data = snapshot.get()
     return render_template('dashboard.html', data=data, theme=THEME)
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
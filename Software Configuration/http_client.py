@@ -0,0 +1,230 @@
+# Food Monitoring System - Upstream HTTP Client
+# One pooled requests.Session per upstream service (ThingSpeak, Pinata, Gemini,
+# Apps Script), so connections are kept alive between calls. Every call gets the
+# service's timeout; idempotent calls are retried with jittered backoff while the
+# service's retry budget allows; a circuit breaker fails fast while a service is
+# down; and per-service latency and error counts are recorded for /upstream_stats.
+# Base URLs are configurable, so the clients can be pointed at local stub servers.
+
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+DEFAULT_RETRIES = 2
+BACKOFF_S = 0.3  # Base of the exponential backoff; each wait is uniform in [0, base * 2^attempt]
+POOL_SIZE = 10
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# Retries may add at most this share of extra load on a struggling service
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 3
+
+FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit
+RESET_TIMEOUT_S = 30  # Time the circuit stays open before a trial call is let through
+
+LATENCY_SAMPLES = 200  # Recent calls used for latency percentiles
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT_S):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'half-open':
+                # Let one trial call through; further calls wait for its outcome
+                self.opened_at = time.monotonic()
+                return True
+            return state == 'closed'
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """Token bucket: every request earns `ratio` of a retry, every retry spends one"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.maximum = max(minimum, 10)
+        self.tokens = float(minimum)
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class UpstreamClient:
+    def __init__(self, name, base_url=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 pool_size=POOL_SIZE, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT_S):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.budget = RetryBudget()
+
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.last_error = None
+
+    def _url(self, url):
+        if self.base_url and not url.startswith(('http://', 'https://')):
+            return self.base_url.rstrip('/') + '/' + url.lstrip('/')
+        return url
+
+    def _record(self, latency, error=None):
+        with self.lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            if error is not None:
+                self.errors += 1
+                self.last_error = error
+
+    def request(self, method, url, retry=None, **kwargs):
+        """Send a request through the service's pool.
+
+        retry defaults to True for idempotent methods only; pass retry=True for POSTs
+        that are safe to repeat. Raises CircuitOpenError while the circuit is open.
+        """
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+        url = self._url(url)
+
+        if not self.breaker.allow():
+            with self.lock:
+                self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open after repeated failures)")
+
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(time.perf_counter() - start, type(e).__name__)
+                self.breaker.record_failure()
+                if not self._should_retry(retry, attempt):
+                    raise
+            else:
+                server_error = response.status_code >= 500
+                self._record(time.perf_counter() - start, f"HTTP {response.status_code}" if server_error else None)
+                if server_error:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or not self._should_retry(retry, attempt):
+                    return response
+                response.close()
+
+            time.sleep(random.uniform(0, BACKOFF_S * 2 ** attempt))
+            attempt += 1
+
+    def _should_retry(self, retry, attempt):
+        # No retries once the failures so far have opened the circuit
+        if not retry or attempt >= self.retries or self.breaker.state != 'closed' or not self.budget.withdraw():
+            return False
+        with self.lock:
+            self.retried += 1
+        return True
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            calls, errors, retried, rejected, last_error = (self.calls, self.errors, self.retried,
+                                                            self.rejected, self.last_error)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            'base_url': self.base_url,
+            'calls': calls,
+            'errors': errors,
+            'retries': retried,
+            'rejected': rejected,
+            'circuit': self.breaker.state,
+            'latency_ms_p50': percentile(0.5),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_max': round(latencies[-1] * 1000, 1) if latencies else None,
+            'last_error': last_error
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, **config):
+    """The process-wide client for a service, created with `config` on first use"""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = UpstreamClient(name, **config)
+        return client
+
+
+def upstream_stats():
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
@@ -0,0 +1,79 @@
+# Food Monitoring System - Metrics Directory Index
+# Keeps an in-memory cycle -> metrics file index of the metrics folder, so routes
+# don't glob and regex-sort the directory on every request. The folder is only
+# rescanned when its mtime changes (a file was added, removed or renamed), which
+# costs a single stat per lookup.
+
+import os
+import re
+import threading
+from datetime import datetime
+
+# The training script writes training_metrics_<cycle>.csv; files named
+# metricstraining_metrics_<cycle>.csv come from a folder path missing its separator
+METRICS_PATTERN = re.compile(r'^(metrics)?training_metrics_(\d+)\.csv$')
+
+
+class MetricsIndex:
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = {}
+        self.latest_cycle = None
+        self.folder_mtime = None
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Rescan the folder if it changed since the last scan"""
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self.lock:
+            if not force and mtime == self.folder_mtime:
+                return
+            self.folder_mtime = mtime
+            self.entries = self._scan() if mtime is not None else {}
+            self.latest_cycle = max(self.entries) if self.entries else None
+
+    def _scan(self):
+        entries = {}
+        with os.scandir(self.folder) as files:
+            for file in files:
+                match = METRICS_PATTERN.match(file.name)
+                if not match or not file.is_file():
+                    continue
+                cycle = int(match.group(2))
+                legacy = match.group(1) is not None
+                # Prefer the training script's own file name when both exist
+                if cycle in entries and legacy and not entries[cycle]['legacy']:
+                    continue
+                entries[cycle] = {
+                    'cycle': cycle,
+                    'file': file.name,
+                    'path': os.path.join(self.folder, file.name),
+                    'created': datetime.fromtimestamp(file.stat().st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
+                    'legacy': legacy
+                }
+        return entries
+
+    def get(self, cycle):
+        """Index entry for a cycle, or None"""
+        self.refresh()
+        return self.entries.get(cycle)
+
+    def path(self, cycle):
+        entry = self.get(cycle)
+        return entry['path'] if entry else None
+
+    def latest(self):
+        """Index entry for the highest cycle, or None"""
+        self.refresh()
+        with self.lock:
+            return self.entries.get(self.latest_cycle) if self.latest_cycle is not None else None
+
+    def list(self):
+        """All entries, newest cycle first"""
+        self.refresh()
+        with self.lock:
+            return [self.entries[cycle] for cycle in sorted(self.entries, reverse=True)]
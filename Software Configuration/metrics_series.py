@@ -0,0 +1,109 @@
+# Food Monitoring System - Metrics Time Series
+# Reads training metrics CSVs into compact per-metric series for client-side
+# charts, downsampled to a point budget so long runs and multi-cycle overlays
+# stay small. LTTB (largest triangle three buckets) keeps the visual shape of a
+# curve; min/max keeps every bucket's extremes, so spikes are never dropped.
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+SERIES_METRICS = ['loss', 'accuracy', 'reward']
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+DEFAULT_POINTS = 500
+MIN_POINTS = 3
+MAX_POINTS = 5000
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick and that average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+
+    return indices
+
+
+def minmax(x, y, threshold):
+    """Indices of each bucket's minimum and maximum, in order"""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+
+    indices = []
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        values = y[bucket]
+        indices.extend(sorted({bucket[values.argmin()], bucket[values.argmax()]}))
+    return np.asarray(indices, dtype=np.int64)
+
+
+def downsample(x, y, points, method='lttb'):
+    """Downsample a series to at most `points` points; non-finite values are dropped"""
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    points = max(points, MIN_POINTS)
+    keep = (minmax if method == 'minmax' else lttb)(x, y, points)
+    return x[keep], y[keep]
+
+
+@lru_cache(maxsize=32)
+def _read_metrics(path, mtime_ns, size):
+    # mtime_ns and size are part of the cache key, so a rewritten file is read again
+    df = pd.read_csv(path)
+    return {column: pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+            for column in ['epoch'] + SERIES_METRICS if column in df.columns}
+
+
+def read_metrics(path):
+    stat = os.stat(path)
+    return _read_metrics(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def latest_metrics(path):
+    """Last row's epoch and metric values of a metrics CSV, without rendering anything"""
+    columns = read_metrics(path)
+    return {column: (float(values[-1]) if len(values) and np.isfinite(values[-1]) else None)
+            for column, values in columns.items()}
+
+
+def version(path):
+    """Cheap version tag for a metrics file, for cache-busting plot URLs"""
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def metrics_series(path, points=DEFAULT_POINTS, method='lttb', metrics=SERIES_METRICS):
+    """{'points': rows in the file, <metric>: {'epoch': [...], 'value': [...]}} for a metrics CSV"""
+    columns = read_metrics(path)
+    epochs = columns.get('epoch')
+    series = {'points': len(epochs) if epochs is not None else 0}
+    if epochs is None:
+        return series
+
+    for metric in metrics:
+        if metric not in columns:
+            continue
+        x, y = downsample(epochs, columns[metric], points, method)
+        series[metric] = {'epoch': x.tolist(), 'value': np.round(y, 6).tolist()}
+    return series
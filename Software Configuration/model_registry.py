@@ -0,0 +1,218 @@
+# Food Monitoring System - Model Registry
+# Indexes trained cycles across model folders together with their checksums and
+# metrics files, records the current cycle in registry.json, and keeps the most
+# recently used models loaded (memory-mapped) in an LRU cache so comparing or
+# A/B-serving cycles doesn't reload weights from disk on every request.
+
+import csv
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+DQN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Deep_Q_Reinforcement')
+if DQN_DIR not in sys.path:
+    sys.path.append(DQN_DIR)
+
+from numpy_dqn import NumpyDQN, WEIGHT_FILE_SUFFIX
+
+MODEL_PATTERN = re.compile(r'food_monitoring_model_cycle_(\d+)(\.pth|\.dqnw)$')
+METRICS_PATTERN = re.compile(r'training_metrics_(\d+)\.csv$')
+REGISTRY_FILE = 'registry.json'
+CACHE_SIZE = 4  # Loaded models kept in memory
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_final_metrics(path):
+    """Last row of a training metrics CSV, with numeric values converted"""
+    last = None
+    with open(path, newline='') as f:
+        for last in csv.DictReader(f):
+            pass
+    if last is None:
+        return {}
+
+    metrics = {}
+    for key in ('epoch', 'loss', 'reward', 'accuracy'):
+        try:
+            metrics[key] = float(last[key])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return metrics
+
+
+def load_model(path):
+    """NumPy engine for a cycle, memory-mapping its weights"""
+    if path.endswith(WEIGHT_FILE_SUFFIX):
+        return NumpyDQN.from_file(path, mmap=True)
+
+    # Cycles without exported weights need torch to read the state_dict
+    import torch
+    try:
+        state_dict = torch.load(path, map_location='cpu', mmap=True)
+    except (TypeError, RuntimeError):
+        # Older torch versions and legacy (non-zip) files can't be memory-mapped
+        state_dict = torch.load(path, map_location='cpu')
+    return NumpyDQN({name: tensor.numpy() for name, tensor in state_dict.items()})
+
+
+class ModelRegistry:
+    def __init__(self, models_folders, metrics_folder=None, cache_size=CACHE_SIZE):
+        if isinstance(models_folders, str):
+            models_folders = [models_folders]
+        self.models_folders = list(models_folders)
+        self.metrics_folder = metrics_folder
+        self.cache_size = cache_size
+
+        self.entries = {}
+        self.file_stats = {}  # (size, mtime) of every model file seen, served or not
+        self.folder_mtimes = None
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _folder_mtimes(self):
+        mtimes = []
+        for folder in self.models_folders + ([self.metrics_folder] if self.metrics_folder else []):
+            try:
+                mtimes.append(os.stat(folder).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _files_changed(self):
+        # A model overwritten in place doesn't change its folder's mtime
+        for path, known in self.file_stats.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return True
+            if (stat.st_size, stat.st_mtime) != known:
+                return True
+        return False
+
+    def refresh(self, force=False):
+        """Rescan the folders if any of them, or any indexed model file, changed since the last scan"""
+        with self.lock:
+            mtimes = self._folder_mtimes()
+            if not force and mtimes == self.folder_mtimes and not self._files_changed():
+                return
+            while True:
+                entries = self._scan(self.entries)
+                if entries == self.entries:
+                    break
+                self.entries = entries
+                self._write_index()
+                # Writing registry.json changes its folder's mtime; scan once more against
+                # the new mtimes so neither our own write nor a change made mid-scan is missed
+                mtimes = self._folder_mtimes()
+            self.folder_mtimes = mtimes
+
+    def _scan(self, previous):
+        entries = {}
+        file_stats = {}
+        for folder in self.models_folders:
+            for path in glob.glob(os.path.join(folder, 'food_monitoring_model_cycle_*')):
+                match = MODEL_PATTERN.search(os.path.basename(path))
+                if not match:
+                    continue
+                cycle = int(match.group(1))
+                stat = os.stat(path)
+                candidate = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+                file_stats[candidate['path']] = (stat.st_size, stat.st_mtime)
+
+                # Prefer the most recently written file for the cycle, so a .dqnw left over from an
+                # earlier run of a reused cycle number never shadows a newer .pth; exported weights
+                # win ties, since they are written right after their .pth
+                current = entries.get(cycle)
+                if current is not None:
+                    current_is_weights = current['path'].endswith(WEIGHT_FILE_SUFFIX)
+                    candidate_is_weights = match.group(2) == WEIGHT_FILE_SUFFIX
+                    if (current['mtime'], current_is_weights) >= (candidate['mtime'], candidate_is_weights):
+                        continue
+                entries[cycle] = candidate
+        self.file_stats = file_stats
+
+        for cycle, entry in entries.items():
+            # Checksums are only recomputed for files that changed
+            old = previous.get(cycle)
+            if old and (old['path'], old['size'], old['mtime']) == (entry['path'], entry['size'], entry['mtime']):
+                entry['sha256'] = old['sha256']
+            else:
+                entry['sha256'] = file_checksum(entry['path'])
+                # A changed file must not be served from the cache
+                self.cache.pop(cycle, None)
+
+        if self.metrics_folder:
+            for path in glob.glob(os.path.join(self.metrics_folder, '*training_metrics_*.csv')):
+                match = METRICS_PATTERN.search(os.path.basename(path))
+                if match and int(match.group(1)) in entries:
+                    entry = entries[int(match.group(1))]
+                    entry['metrics_file'] = os.path.abspath(path)
+                    try:
+                        entry['final_metrics'] = read_final_metrics(path)
+                    except (OSError, csv.Error) as e:
+                        print(f"Could not read metrics file {path}: {e}")
+
+        return entries
+
+    def _write_index(self):
+        index = {
+            'current_cycle': max(self.entries) if self.entries else None,
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'cycles': {str(cycle): entry for cycle, entry in sorted(self.entries.items())}
+        }
+        path = os.path.join(self.models_folders[0], REGISTRY_FILE)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(index, f, indent=2)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"Could not write model registry index {path}: {e}")
+
+    @property
+    def current_cycle(self):
+        self.refresh()
+        return max(self.entries) if self.entries else None
+
+    def cycles(self):
+        """All indexed cycles with their file, checksum and metrics details"""
+        self.refresh()
+        return {cycle: dict(entry) for cycle, entry in sorted(self.entries.items())}
+
+    def get(self, cycle=None):
+        """Return (cycle, model) for the given cycle, or the current one"""
+        self.refresh()
+        with self.lock:
+            if cycle is None:
+                if not self.entries:
+                    raise LookupError(f"No trained model found in {', '.join(self.models_folders)}")
+                cycle = max(self.entries)
+            if cycle not in self.entries:
+                raise LookupError(f"No model for cycle {cycle}")
+
+            model = self.cache.get(cycle)
+            if model is not None:
+                self.cache.move_to_end(cycle)
+                return cycle, model
+            path = self.entries[cycle]['path']
+
+        # Load outside the lock so a slow load doesn't block cache hits
+        model = load_model(path)
+        with self.lock:
+            self.cache[cycle] = model
+            self.cache.move_to_end(cycle)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return cycle, model
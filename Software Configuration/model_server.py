@@ -0,0 +1,198 @@
+# Food Monitoring System - Model Server
+# Keeps the latest trained DQN in memory and turns sensor readings into
+# Keep / Market / NGO decisions. Concurrent requests are micro-batched so a
+# burst of readings from the device fleet costs a single forward pass.
+# Models come from the ModelRegistry, which evaluates them with the NumPy engine;
+# a request may pin a specific cycle for comparisons or A/B serving.
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Action indices match the training script: 0 = Keep, 1 = Market, 2 = Food Bank/NGO
+ACTIONS = ['Keep', 'Market', 'NGO']
+FEATURES = ['Temperature', 'Humidity', 'Gas', 'TimeSinceStart']
+
+MAX_BATCH_SIZE = 512  # Readings per forward pass
+BATCH_WINDOW_S = 0.002  # How long the first request waits for others to join its batch
+REQUEST_TIMEOUT_S = 5
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_timestamp(value):
+    """Epoch seconds for a reading's timestamp: a number of seconds or an ISO / sheet-format string.
+
+    Times without a zone are read like the sheet's timestamps during training.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return (parsed - EPOCH).total_seconds()
+
+
+def parse_readings(payload):
+    """Turn a JSON reading, or {"readings": [...]}, into an (n, 4) float32 array.
+
+    Keys may use the sheet column names or snake_case. Each reading needs TimeSinceStart
+    (hours since the training data's first reading) or a Timestamp; for readings that only
+    have a Timestamp the TimeSinceStart column is NaN, to be filled in from the serving
+    model's time origin.
+    Returns (features, timestamps, is_batch); timestamps is None if every reading had TimeSinceStart.
+    """
+    is_batch = isinstance(payload, dict) and 'readings' in payload
+    readings = payload['readings'] if is_batch else [payload]
+    if not isinstance(readings, list) or not readings:
+        raise ValueError("Expected a reading object or a non-empty 'readings' list")
+
+    aliases = {
+        'Temperature': ('Temperature', 'temperature'),
+        'Humidity': ('Humidity', 'humidity'),
+        'Gas': ('Gas', 'gas'),
+        'TimeSinceStart': ('TimeSinceStart', 'time_since_start')
+    }
+    rows = []
+    timestamps = []
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            raise ValueError(f"Reading {i} is not an object")
+        row = []
+        timestamp = np.nan
+        for feature in FEATURES:
+            value = next((reading[key] for key in aliases[feature] if key in reading), None)
+            if value is None and feature == 'TimeSinceStart':
+                stamp = next((reading[key] for key in ('Timestamp', 'timestamp') if key in reading), None)
+                if stamp is None:
+                    raise ValueError(f"Reading {i} needs 'TimeSinceStart' or 'Timestamp'")
+                try:
+                    timestamp = parse_timestamp(stamp)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Reading {i} has an unreadable 'Timestamp': {stamp!r}")
+                value = np.nan
+            elif value is None:
+                raise ValueError(f"Reading {i} is missing '{feature}'")
+            try:
+                row.append(float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Reading {i} has a non-numeric '{feature}': {value!r}")
+        rows.append(row)
+        timestamps.append(timestamp)
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    return np.asarray(rows, dtype=np.float32), (None if np.isnan(timestamps).all() else timestamps), is_batch
+
+
+def fill_time_since_start(features, timestamps, model, cycle):
+    """Features with TimeSinceStart derived from timestamps where the reading only had a Timestamp"""
+    if timestamps is None:
+        return features
+    time_origin = getattr(model, 'time_origin', None)
+    if time_origin is None:
+        raise ValueError(f"Cycle {cycle} was exported without a time origin; send 'TimeSinceStart' instead of 'Timestamp'")
+    features = features.copy()
+    missing = np.isnan(features[:, 3])
+    features[missing, 3] = (timestamps[missing] - time_origin) / 3600
+    return features
+
+
+class _PendingRequest:
+    def __init__(self, features, cycle=None, timestamps=None):
+        self.features = features
+        self.timestamps = timestamps  # Epoch seconds for readings without TimeSinceStart
+        self.requested_cycle = cycle  # None means the current cycle
+        self.done = threading.Event()
+        self.q_values = None
+        self.cycle = None
+        self.error = None
+
+
+class ModelServer:
+    def __init__(self, registry, max_batch_size=MAX_BATCH_SIZE, batch_window=BATCH_WINDOW_S):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='model-server', daemon=True)
+                self.worker.start()
+
+    def _run(self):
+        while True:
+            # Block for the first request, then gather whatever arrives within the window
+            batch = [self.requests.get()]
+            rows = len(batch[0].features)
+            deadline = time.monotonic() + self.batch_window
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                rows += len(pending.features)
+
+            # One forward pass per requested cycle
+            groups = defaultdict(list)
+            for pending in batch:
+                groups[pending.requested_cycle].append(pending)
+
+            for requested_cycle, group in groups.items():
+                try:
+                    cycle, model = self.registry.get(requested_cycle)
+                    # Requests whose timestamps this model can't convert fail on their own
+                    ready = []
+                    for pending in group:
+                        try:
+                            pending.features = fill_time_since_start(pending.features, pending.timestamps, model, cycle)
+                            ready.append(pending)
+                        except ValueError as e:
+                            pending.error = e
+                    if not ready:
+                        continue
+                    q_values = model(np.concatenate([pending.features for pending in ready]))
+                    offset = 0
+                    for pending in ready:
+                        pending.q_values = q_values[offset:offset + len(pending.features)]
+                        pending.cycle = cycle
+                        offset += len(pending.features)
+                except Exception as e:
+                    for pending in group:
+                        pending.error = e
+                finally:
+                    for pending in group:
+                        pending.done.set()
+
+    def predict(self, features, cycle=None, timestamps=None, timeout=REQUEST_TIMEOUT_S):
+        """Score an (n, 4) feature array with the given (or current) cycle; returns (q_values, cycle)"""
+        self._ensure_worker()
+        pending = _PendingRequest(features, cycle, timestamps)
+        self.requests.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the model server")
+        if pending.error is not None:
+            raise pending.error
+        return pending.q_values, pending.cycle
+
+    def decide(self, features, cycle=None, timestamps=None):
+        """Score readings and return one decision dict per reading, plus the model cycle"""
+        q_values, cycle = self.predict(features, cycle, timestamps)
+        actions = q_values.argmax(axis=1)
+        return [{
+            'action': ACTIONS[action],
+            'action_id': int(action),
+            'q_values': [float(q) for q in row]
+        } for action, row in zip(actions, q_values)], cycle
@@ -0,0 +1,124 @@
+# Food Monitoring System - Metrics Plot Cache
+# Renders the two-panel accuracy/loss figure for a training metrics CSV once per
+# file version and keeps the PNG (with its ETag and last metrics row) in a
+# byte-bounded LRU cache. Metrics files don't change after their cycle finishes,
+# so repeated dashboard loads are served from memory, or as 304s by the routes.
+# pyplot keeps global figure state, so all rendering happens under one lock.
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+PLOT_CACHE_BYTES = 16 * 1024 * 1024
+
+# Serializes every use of pyplot in the process
+PYPLOT_LOCK = threading.Lock()
+
+
+class RenderedPlot:
+    def __init__(self, png, latest):
+        self.png = png
+        self.etag = hashlib.sha1(png).hexdigest()
+        self.latest = latest  # Last row of the metrics file
+
+    @property
+    def nbytes(self):
+        return len(self.png)
+
+
+def render_metrics_plot(df, title_suffix=''):
+    """PNG bytes of the accuracy and loss curves in a metrics DataFrame"""
+    with PYPLOT_LOCK:
+        plt.figure(figsize=(10, 6))
+
+        # Plot accuracy
+        plt.subplot(1, 2, 1)
+        plt.plot(df['epoch'], df['accuracy'], 'g-', label='Accuracy')
+        if 'val_accuracy' in df.columns:
+            plt.plot(df['epoch'], df['val_accuracy'], 'g--', label='Validation Accuracy')
+        plt.title(f'Model Accuracy{title_suffix}')
+        plt.xlabel('Epoch')
+        plt.ylabel('Accuracy')
+        plt.legend()
+        plt.grid(True, linestyle='--', alpha=0.7)
+
+        # Plot loss
+        plt.subplot(1, 2, 2)
+        plt.plot(df['epoch'], df['loss'], 'g-', label='Loss')
+        if 'val_loss' in df.columns:
+            plt.plot(df['epoch'], df['val_loss'], 'g--', label='Validation Loss')
+        plt.title(f'Model Loss{title_suffix}')
+        plt.xlabel('Epoch')
+        plt.ylabel('Loss')
+        plt.legend()
+        plt.grid(True, linestyle='--', alpha=0.7)
+
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        try:
+            plt.savefig(buf, format='png')
+        finally:
+            plt.close()
+        return buf.getvalue()
+
+
+class PlotCache:
+    def __init__(self, max_bytes=PLOT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.render_lock = threading.Lock()  # One render at a time, so concurrent misses render once
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        with self.lock:
+            plot = self.entries.get(key)
+            if plot is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return plot
+
+    def get(self, path, title_suffix=''):
+        """RenderedPlot for a metrics CSV, rendering it only if the file changed"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, title_suffix)
+
+        plot = self._lookup(key)
+        if plot is not None:
+            return plot
+
+        with self.render_lock:
+            plot = self._lookup(key)
+            if plot is not None:
+                return plot
+            df = pd.read_csv(path)
+            plot = RenderedPlot(render_metrics_plot(df, title_suffix), df.iloc[-1].to_dict())
+            self._store(key, plot)
+        return plot
+
+    def _store(self, key, plot):
+        with self.lock:
+            self.misses += 1
+            # Older versions of the same file can never be requested again
+            for stale in [k for k in self.entries if k[0] == key[0] and k[3] == key[3]]:
+                self.nbytes -= self.entries.pop(stale).nbytes
+            if plot.nbytes <= self.max_bytes:
+                self.entries[key] = plot
+                self.nbytes += plot.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses}
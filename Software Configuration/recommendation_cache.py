@@ -0,0 +1,80 @@
+# Food Monitoring System - Recommendation Cache
+# Keeps generated Gemini recommendations keyed on a fingerprint of the prompt
+# inputs (recent sensor rows, latest metrics) plus language, so page loads and
+# language switches reuse the last answer until the inputs change or the TTL
+# expires. Concurrent requests for the same key share one upstream call.
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+RECOMMENDATION_TTL_S = 600
+MAX_ENTRIES = 64
+
+
+def fingerprint(*inputs):
+    """Stable hash of JSON-serializable prompt inputs"""
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class RecommendationCache:
+    def __init__(self, ttl=RECOMMENDATION_TTL_S, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.in_flight = {}  # key -> Future shared by concurrent callers
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Cached value for a key, or None if missing or expired"""
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return (value, cached). Only one caller runs compute() for a key at a time;
+        the others wait for its result. Failures are not cached."""
+        with self.lock:
+            value = self._get(key)
+            if value is not None:
+                return value, True
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+
+        if not owner:
+            return future.result(), True
+
+        try:
+            value = compute()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value, False
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
@@ -0,0 +1,115 @@
+# Food Monitoring System - Shared Google Sheets Client
+# One authorized gspread client per process (its token is reused and refreshed
+# rather than re-created per request), cached worksheet handles, and tail reads:
+# only the last N rows of a worksheet are fetched, through an open-ended range
+# that starts just above the last known data row and widens until it has enough
+# rows. Results are kept for a short TTL so concurrent readers share one fetch.
+
+import os
+import sys
+import threading
+import time
+
+import gspread
+from gspread.utils import numericise_all
+from oauth2client.service_account import ServiceAccountCredentials
+
+DQN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Deep_Q_Reinforcement')
+if DQN_DIR not in sys.path:
+    sys.path.append(DQN_DIR)
+
+from sensor_cache import column_letter
+
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+SHEET_CACHE_TTL_S = 10
+TAIL_SLACK_ROWS = 20  # Extra rows read above the expected tail to absorb rows appended since the last read
+
+
+class SheetsClient:
+    def __init__(self, credentials_path, sheet_url, ttl=SHEET_CACHE_TTL_S):
+        self.credentials_path = credentials_path
+        self.sheet_url = sheet_url
+        self.ttl = ttl
+
+        self.client = None
+        self.spreadsheet = None
+        self.worksheets = {}
+        self.headers = {}
+        self.last_rows = {}  # Last data row seen per worksheet (1-based, header is row 1)
+        self.cache = {}  # (worksheet, limit) -> (fetched_at, records)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _worksheet(self, name):
+        with self.lock:
+            if self.spreadsheet is None:
+                credentials = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_path, SCOPE)
+                self.client = gspread.authorize(credentials)
+                self.spreadsheet = self.client.open_by_url(self.sheet_url)
+            if name not in self.worksheets:
+                self.worksheets[name] = self.spreadsheet.worksheet(name)
+            return self.worksheets[name]
+
+    def reset(self):
+        """Drop the client and handles so the next read re-authorizes"""
+        with self.lock:
+            self.client = None
+            self.spreadsheet = None
+            self.worksheets = {}
+            self.headers = {}
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def records(self, name, limit=None):
+        """Rows of a worksheet as dicts keyed by its header, oldest first.
+
+        With a limit only the last `limit` data rows are read. Results are cached for the TTL,
+        per (worksheet, limit), so callers should use a few fixed limits rather than user input.
+        """
+        key = (name, limit)
+        cached = self.cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        # Concurrent readers of the same key wait for a single fetch
+        with self._key_lock(key):
+            cached = self.cache.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            try:
+                worksheet = self._worksheet(name)
+                if limit is None:
+                    records = worksheet.get_all_records()
+                else:
+                    records = self._tail_records(name, worksheet, limit)
+            except Exception:
+                # Possibly stale credentials or handles; start over on the next read
+                self.reset()
+                raise
+            self.cache[key] = (time.monotonic(), records)
+            return records
+
+    def _tail_records(self, name, worksheet, limit):
+        header = self.headers.get(name)
+        if header is None:
+            header = worksheet.row_values(1)
+            self.headers[name] = header
+        last_column = column_letter(len(header))
+
+        # Start near the last data row seen before; on the first read the grid size is the best guess
+        last_row = self.last_rows.get(name, worksheet.row_count)
+        window = limit + TAIL_SLACK_ROWS
+        while True:
+            start = max(2, last_row - window + 1)
+            # Open-ended, so rows appended since last_row are included
+            rows = [row for row in worksheet.get_values(f"A{start}:{last_column}") if any(row)]
+            if len(rows) >= limit or start == 2:
+                break
+            window *= 2
+
+        if rows:
+            self.last_rows[name] = start + len(rows) - 1
+        width = len(header)
+        return [dict(zip(header, numericise_all(row + [''] * (width - len(row))))) for row in rows[-limit:]]
@@ -0,0 +1,39 @@
+import dashboard
+
+SHEETS = {
+    'SensorData': "Timestamp,Temperature,Humidity,Gas,Status\n2025-01-01 10:00:00,4,60,120,Normal\n",
+    'EmailLog': "Timestamp,Recipients,Status\n2025-01-01 10:05:00,ops@example.com,Sent\n",
+    'training_metrics': "<!DOCTYPE html><html><body>Script function not found</body></html>\n",
+    'trainingmetrics1': "epoch,loss,accuracy\n1,0.5,80\n"
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+def test_html_body_for_metrics_sheet_is_a_missing_source(monkeypatch):
+    monkeypatch.setattr(dashboard.script_client, 'get',
+                        lambda url, params=None, timeout=None: FakeResponse(SHEETS[params['sheet']]))
+
+    data = dashboard.get_data()
+
+    assert data['missing_sources'] == ['training_metrics']
+    assert data['metrics'] == []
+    assert data['csv_status'] == 'Normal'
+    assert len(data['email_log']) == 1
+
+
+def test_html_body_for_second_metrics_sheet_is_not_merged(monkeypatch):
+    sheets = dict(SHEETS, training_metrics=SHEETS['trainingmetrics1'], trainingmetrics1=SHEETS['training_metrics'])
+    monkeypatch.setattr(dashboard.script_client, 'get',
+                        lambda url, params=None, timeout=None: FakeResponse(sheets[params['sheet']]))
+
+    data = dashboard.get_data()
+
+    assert data['missing_sources'] == ['trainingmetrics1']
+    assert data['metrics'] == [{'epoch': 1, 'loss': 0.5, 'accuracy': 80}]
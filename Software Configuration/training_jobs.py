@@ -0,0 +1,303 @@
+# Food Monitoring System - Training Job Queue
+# Runs training in the background so /run_training returns immediately with a job id.
+# Only one training job can be queued or running at a time: submitting while one is
+# active returns the active job instead of starting a duplicate run. This holds per
+# process only; when app.py is served by several worker processes (e.g. gunicorn
+# -w N), each has its own queue and two of them can train at the same time.
+# The per-episode lines the training script prints are parsed into progress events
+# that clients can follow live through stream() (Server-Sent Events).
+# Jobs run either as a fresh training-script subprocess each time, or on a warm
+# TrainingWorker (Deep_Q_Reinforcement/training_worker.py) that stays loaded between runs.
+
+import itertools
+import json
+import math
+import queue
+import re
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+JOB_TIMEOUT_S = 300
+OUTPUT_LINES = 50  # Tail of the training output kept per job
+HISTORY_SIZE = 20  # Finished jobs kept for status lookups
+CANCEL_GRACE_S = 10  # Time a cancelled process gets to exit before it is killed
+HEARTBEAT_S = 15  # Idle time after which a stream sends a keep-alive comment
+
+# Lines printed by train_model and run_training_cycle in deepq_reinforcement.py
+EPISODE_PATTERN = re.compile(r'Episode (\d+)/(\d+) - Loss: ([-\d.naif]+), '
+                             r'Reward: ([-\d.naif]+), Accuracy: ([-\d.naif]+)%')
+CYCLE_PATTERN = re.compile(r'Starting training cycle (\d+)')
+
+
+def _number(text):
+    # NaN/inf aren't valid JSON, so they are sent as null
+    value = float(text)
+    return value if math.isfinite(value) else None
+
+
+def parse_progress(line):
+    """Turn a line of training output into an (event, data) pair, or None"""
+    match = EPISODE_PATTERN.search(line)
+    if match:
+        return 'episode', {
+            'episode': int(match.group(1)),
+            'episodes': int(match.group(2)),
+            'loss': _number(match.group(3)),
+            'reward': _number(match.group(4)),
+            'accuracy': _number(match.group(5))
+        }
+    match = CYCLE_PATTERN.search(line)
+    if match:
+        return 'cycle', {'cycle': int(match.group(1))}
+    return None
+
+
+class TrainingJob:
+    def __init__(self, number):
+        self.id = uuid.uuid4().hex[:12]
+        self.number = number
+        self.state = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.returncode = None
+        self.message = 'Waiting for the training worker'
+        self.result = None
+        self.output = deque(maxlen=OUTPUT_LINES)
+        self.events = []  # (event, data) in order; an event's SSE id is its position + 1
+        self.cancel_requested = threading.Event()
+        self.process = None
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'number': self.number,
+            'state': self.state,
+            'message': self.message,
+            'created': _timestamp(self.created),
+            'started': _timestamp(self.started),
+            'finished': _timestamp(self.finished),
+            'duration_s': round((self.finished or time.time()) - self.started, 1) if self.started else None,
+            'returncode': self.returncode,
+            'result': self.result,
+            'output': list(self.output)
+        }
+
+
+def _timestamp(value):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value)) if value else None
+
+
+class TrainingJobQueue:
+    def __init__(self, command=None, cwd=None, timeout=JOB_TIMEOUT_S, on_success=None, worker=None):
+        if command is None and worker is None:
+            raise ValueError("TrainingJobQueue needs a command or a worker")
+        self.command = command
+        self.cwd = cwd
+        self.worker = worker  # Preferred over spawning the command when given
+        self.timeout = timeout
+        self.on_success = on_success  # Called after a successful run; its return value is job.result
+
+        self.jobs = OrderedDict()
+        self.pending = queue.Queue()
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # Notified whenever a job gets a new event
+        self.runner = None
+
+    def _ensure_runner(self):
+        if self.runner is None or not self.runner.is_alive():
+            self.runner = threading.Thread(target=self._run, name='training-jobs', daemon=True)
+            self.runner.start()
+
+    def submit(self):
+        """Queue a training run; returns (job, created), reusing the active job if there is one"""
+        with self.lock:
+            for job in self.jobs.values():
+                if job.active:
+                    return job, False
+
+            job = TrainingJob(next(self.counter))
+            self.jobs[job.id] = job
+            # Subscribers see the job as queued before the runner picks it up
+            self._publish_state(job)
+            self._prune()
+            self._ensure_runner()
+            self.pending.put(job)
+            return job, True
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:-HISTORY_SIZE]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job, or None if it doesn't exist"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return job
+            job.cancel_requested.set()
+            if job.state == QUEUED:
+                self._finish(job, CANCELLED, 'Cancelled before it started')
+                return job
+            job.message = 'Cancelling training'
+            self._publish_state(job)
+            process = job.process
+
+        if process is not None:
+            _stop(process)
+        return job
+
+    def _publish(self, job, event, data):
+        # Callers hold self.lock
+        job.events.append((event, data))
+        self.changed.notify_all()
+
+    def _publish_state(self, job):
+        self._publish(job, 'state', {'state': job.state, 'message': job.message, 'result': job.result})
+
+    def _finish(self, job, state, message):
+        job.state = state
+        job.message = message
+        job.finished = time.time()
+        self._publish_state(job)
+
+    def stream(self, job, after=0, heartbeat=HEARTBEAT_S):
+        """Yield a job's events as Server-Sent Events, starting after event id `after`,
+        until the job has finished"""
+        position = after
+        while True:
+            with self.changed:
+                if position >= len(job.events) and job.active:
+                    self.changed.wait(heartbeat)
+                events = job.events[position:]
+                finished = not job.active
+
+            if not events and not finished:
+                yield ': keep-alive\n\n'
+                continue
+            for offset, (event, data) in enumerate(events, start=position + 1):
+                yield f"id: {offset}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            position += len(events)
+            if finished:
+                return
+
+    def _run(self):
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                if job.state != QUEUED:
+                    continue  # Cancelled while waiting
+                job.state = RUNNING
+                job.started = time.time()
+                job.message = 'Training in progress'
+                self._publish_state(job)
+
+            try:
+                if self.worker is not None:
+                    self._execute_on_worker(job)
+                else:
+                    self._execute(job)
+            except Exception as e:
+                with self.lock:
+                    self._finish(job, FAILED, f"Could not run training: {e}")
+
+    def _handle_line(self, job, line):
+        job.output.append(line)
+        progress = parse_progress(line)
+        if progress:
+            with self.lock:
+                self._publish(job, *progress)
+
+    def _complete(self, job, state, message):
+        # Runs without the lock held, since on_success may be slow
+        result = self.on_success() if state == DONE and self.on_success else None
+        with self.lock:
+            job.result = result
+            self._finish(job, state, message)
+
+    def _execute_on_worker(self, job):
+        # The worker watches job.cancel_requested itself, so cancel() has no process to stop
+        state, message = self.worker.run(job.id, lambda line: self._handle_line(job, line),
+                                         job.cancel_requested, self.timeout)
+        if state == DONE:
+            message = 'Training completed successfully'
+        elif state == CANCELLED:
+            message = message or 'Training was cancelled'
+        else:
+            state = FAILED
+            message = message or "Unknown error occurred during training"
+        self._complete(job, state, message)
+
+    def _execute(self, job):
+        process = subprocess.Popen(self.command, cwd=self.cwd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, bufsize=1)
+        with self.lock:
+            job.process = process
+        if job.cancel_requested.is_set():
+            _stop(process)
+
+        # Stop the run if it outlives the timeout; reading stdout below ends once it exits
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            _stop(process)
+
+        timer = threading.Timer(self.timeout, expire) if self.timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            for line in process.stdout:
+                self._handle_line(job, line.rstrip('\n'))
+            process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            process.stdout.close()
+
+        with self.lock:
+            job.process = None
+            job.returncode = process.returncode
+
+        if job.cancel_requested.is_set():
+            self._complete(job, CANCELLED, 'Training was cancelled')
+        elif expired.is_set():
+            self._complete(job, FAILED, f"Training timed out after {self.timeout} seconds")
+        elif process.returncode != 0:
+            error = job.output[-1] if job.output else "Unknown error occurred during training"
+            self._complete(job, FAILED, error)
+        else:
+            self._complete(job, DONE, 'Training completed successfully')
+
+
+def _stop(process):
+    """Ask a training process to exit, killing it if it hasn't after the grace period"""
+    process.terminate()
+    killer = threading.Timer(CANCEL_GRACE_S, lambda: process.poll() is None and process.kill())
+    killer.daemon = True
+    killer.start()